@@ -0,0 +1,104 @@
+"""Request classes and per-client rate limits.
+
+Requests are split into classes: "gate" for login and the session start/stop
+and vehicle entry routes, "batch" for billing, exports and admin dumps,
+"stream" for the long-lived event streams, and "interactive" for the rest.
+Every class is served by its own worker pool (see scheduler), so a flood of
+reports cannot hold up gates.
+
+Within a class, every signed-in user (or client address for requests without
+a valid session) has a token bucket refilled at `rate` requests per second up
+to `burst`. An empty bucket is answered with 429 and Retry-After. At most
+MAX_BUCKETS buckets are kept; the least recently used one is dropped first.
+
+Limits are set per class as PARKING_LIMIT_<CLASS>="rate,burst,workers,queue".
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+CLASS_ROUTES = {
+    "gate": {
+        ("POST", "/login"),
+        ("POST", "/parking-lots/{id}/sessions/start"),
+        ("POST", "/parking-lots/{id}/sessions/stop"),
+        ("POST", "/vehicles/{id}/entry")
+    },
+    "batch": {
+        ("GET", "/billing"),
+        ("GET", "/billing/{id}"),
+        ("GET", "/admin/billing/export"),
+        ("GET", "/admin/profiles"),
+        ("GET", "/parking-lots/{id}/sessions"),
+        ("GET", "/payments"),
+        ("GET", "/payments/{id}"),
+        ("GET", "/admin/vehicles/{id}"),
+        ("POST", "/payments/bulk"),
+        ("POST", "/admin/archive"),
+        ("PUT", "/payments/bulk")
+    },
+    "stream": {
+        ("GET", "/parking-lots/{id}/events")
+    }
+}
+DEFAULT_CLASS = "interactive"
+DEFAULT_LIMITS = {
+    "gate": (20, 40, 16, 64),
+    "interactive": (10, 30, 8, 32),
+    "batch": (0.5, 3, 2, 4),
+    "stream": (1, 5, 256, 0)
+}
+MAX_BUCKETS = 10000
+
+
+def _limits(name, default):
+    value = os.environ.get(f"PARKING_LIMIT_{name.upper()}")
+    if not value:
+        return default
+    rate, burst, workers, queue = value.split(",")
+    return float(rate), float(burst), int(workers), int(queue)
+
+
+LIMITS = {name: _limits(name, default) for name, default in DEFAULT_LIMITS.items()}
+_routes = {route: name for name, routes in CLASS_ROUTES.items() for route in routes}
+_buckets = OrderedDict()
+_buckets_lock = threading.Lock()
+
+
+def route_class(method, path):
+    return _routes.get((method, metrics.route_for(path)), DEFAULT_CLASS)
+
+
+def _take(key, rate, burst):
+    """Take a token from the bucket; return 0, or the seconds until one is available."""
+    now = time.monotonic()
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            # least recently used buckets go first; they have refilled the longest
+            while len(_buckets) >= MAX_BUCKETS:
+                _buckets.popitem(last=False)
+            bucket = _buckets[key] = [burst, now]
+        else:
+            _buckets.move_to_end(key)
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0
+        bucket[0] = tokens
+        return (1 - tokens) / rate if rate > 0 else 60
+
+
+def admit(method, path, client):
+    """Return None when the client may make this request, or (status, retry_after, error).
+    `client` must not be chosen by the client itself: a validated username or its address."""
+    name = route_class(method, path)
+    rate, burst = LIMITS[name][:2]
+    wait = _take((client, name), rate, burst)
+    if wait:
+        return 429, math.ceil(wait), "Too many requests"
+    return None
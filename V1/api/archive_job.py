@@ -0,0 +1,66 @@
+"""Move finished sessions and completed payments into compressed archive segments.
+
+    python archive_job.py --keep-days 30
+
+Run from the directory that contains data/, like the server. The server and
+this job both hold storage_utils.lock_data while they write data/, so the job
+refuses to run next to a running server; archive through the server's
+POST /admin/archive instead, which calls `run`. The segments are built
+without write_lock, which is only taken per lot, and once for the payments,
+to drop the moved records from the live files.
+"""
+import argparse
+import os
+import sys
+import threading
+from storage_utils import load_json, load_parking_lot_data, lock_data, save_data
+import session_store
+import payment_archive
+
+_running = threading.Lock()
+
+
+def migrate_partitions(lid):
+    """Rewrite the plain json monthly partitions of an earlier layout as segments."""
+    manifest = session_store.load_manifest(lid)
+    migrated = 0
+    for month, info in list(manifest["partitions"].items()):
+        if info.get("format") == "segment":
+            continue
+        legacy = f'{session_store.ARCHIVE_DIR}/p{lid}-{month}.json'
+        manifest["partitions"][month] = session_store.write_partition(lid, month, load_json(legacy) or {})
+        save_data(session_store.manifest_file(lid), manifest)
+        os.remove(legacy)
+        migrated += 1
+    return migrated
+
+
+def run(keep_days=30):
+    """Archive every lot and the payments; returns the counts per lot and for the payments."""
+    # one run at a time, as the segments are built outside write_lock
+    with _running:
+        result = {"lots": {}}
+        for lid in load_parking_lot_data():
+            migrated = migrate_partitions(lid)
+            archived = session_store.archive_sessions(lid, keep_days)
+            result["lots"][lid] = {"archived": archived, "migrated": migrated}
+        result["payments"] = payment_archive.archive_payments(keep_days)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keep-days", type=int, default=30, help="records newer than this stay in the live files")
+    args = parser.parse_args()
+    lock = lock_data()
+    if lock is None:
+        sys.exit("data/ is in use by a running server; archive through POST /admin/archive instead")
+    with lock:
+        result = run(args.keep_days)
+    for lid, counts in result["lots"].items():
+        print(f"p{lid}: archived {counts['archived']} sessions, migrated {counts['migrated']} partitions")
+    print(f"payments: archived {result['payments']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compressed column-oriented segment files for archived records.
+
+A segment is a small header followed by one zlib-compressed json array per
+column:
+
+    b"PSEG1\\n" | header length (4 bytes, big endian) | header json | column blobs
+
+The header holds the record count, the min/max record time and the offset
+and length of every column, so a reader can skip a segment on its metadata
+and only inflate the columns it filters on before touching the rest.
+Times are stored as whole seconds since 01-01-2000 00:00:00 (local time).
+"""
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+import metrics
+
+MAGIC = b"PSEG1\n"
+EPOCH = datetime(2000, 1, 1)
+
+
+def to_seconds(value):
+    return int((value - EPOCH).total_seconds())
+
+
+def from_seconds(value):
+    return EPOCH + timedelta(seconds=value)
+
+
+def write_segment(filename, kind, columns, min_time, max_time):
+    start = time.perf_counter()
+    count = len(next(iter(columns.values()), []))
+    blobs = []
+    offsets = {}
+    position = 0
+    for name, values in columns.items():
+        blob = zlib.compress(json.dumps(values, separators=(",", ":"), default=str).encode("utf-8"), 6)
+        offsets[name] = [position, len(blob)]
+        position += len(blob)
+        blobs.append(blob)
+    header = json.dumps({"kind": kind, "count": count, "min_time": min_time, "max_time": max_time, "columns": offsets}).encode("utf-8")
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack(">I", len(header)))
+        file.write(header)
+        for blob in blobs:
+            file.write(blob)
+    os.replace(tmp, filename)
+    metrics.observe_storage('save', filename, time.perf_counter() - start)
+
+
+def read_header(file):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{file.name} is not a segment file")
+    length, = struct.unpack(">I", file.read(4))
+    header = json.loads(file.read(length))
+    header["data_offset"] = len(MAGIC) + 4 + length
+    return header
+
+
+def read_columns(filename, names):
+    start = time.perf_counter()
+    try:
+        with open(filename, 'rb') as file:
+            header = read_header(file)
+            columns = {}
+            for name in names:
+                offset, length = header["columns"][name]
+                file.seek(header["data_offset"] + offset)
+                columns[name] = json.loads(zlib.decompress(file.read(length)))
+            return columns
+    finally:
+        metrics.observe_storage('load', filename, time.perf_counter() - start)
+
+
+def read_rows(filename, filters=None, names=None):
+    """Yield records (dicts of column values) whose columns pass `filters`.
+
+    `filters` maps a column name, or a tuple of names, to a predicate over
+    those columns' values. Only the filter columns are inflated until a
+    record matches; the other columns are read afterwards.
+    """
+    filters = {(key,) if isinstance(key, str) else key: check for key, check in (filters or {}).items()}
+    with open(filename, 'rb') as file:
+        header = read_header(file)
+    names = names or list(header["columns"])
+    if filters:
+        filtered = read_columns(filename, list(dict.fromkeys(name for key in filters for name in key)))
+        matches = [i for i in range(header["count"]) if all(check(*(filtered[name][i] for name in key)) for key, check in filters.items())]
+        if not matches:
+            return
+    else:
+        filtered = {}
+        matches = range(header["count"])
+    columns = filtered | read_columns(filename, [name for name in names if name not in filtered])
+    for i in matches:
+        yield {name: columns[name][i] for name in names}
+
+
+def bloom(values, bits_per_key=10, hashes=7):
+    keys = set(values)
+    size = max(64, (len(keys) * bits_per_key + 7) // 8 * 8)
+    bits = bytearray(size // 8)
+    for key in keys:
+        for bit in _bloom_bits(key, size, hashes):
+            bits[bit >> 3] |= 1 << (bit & 7)
+    return {"hashes": hashes, "bits": base64.b64encode(bytes(bits)).decode("ascii")}
+
+
+def might_contain(filter, value):
+    bits = base64.b64decode(filter["bits"])
+    return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in _bloom_bits(value, len(bits) * 8, filter["hashes"]))
+
+
+def _bloom_bits(key, size, hashes):
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % size for i in range(hashes)]
@@ -0,0 +1,132 @@
+"""Billing rows for the billing endpoints and the admin export.
+
+Lots are priced one at a time in-process. When the sessions to read add up
+to more than PARKING_BILLING_PARALLEL_BYTES (default 8 MiB), every lot is
+priced in a pool of PARKING_BILLING_WORKERS processes instead (default one
+per core, 0 disables the pool). The parent process merges the per-lot
+results with the payment totals. A lot whose sessions are waiting in the
+write-behind buffer is always priced in-process, because worker processes
+only see what has been written to disk.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from storage_utils import read_snapshot, is_pending
+import session_calculator as sc
+import session_store
+import discounts
+
+EXPORT_FIELDS = ["user", "lot", "session", "licenseplate", "started", "stopped", "hours", "days", "amount", "payed", "balance", "thash"]
+WORKERS = int(os.environ.get("PARKING_BILLING_WORKERS", os.cpu_count() or 1))
+PARALLEL_BYTES = int(os.environ.get("PARKING_BILLING_PARALLEL_BYTES", 8 << 20))
+
+_pool = None
+
+
+def _price_lot(pid, parkinglot, since, until, user, rules):
+    priced = []
+    for sid, session in session_store.iter_sessions(pid, since, until, user=user):
+        if user is None or session["user"] == user:
+            amount, hours, days = sc.calculate_price(parkinglot, sid, session, rules, pid)
+            priced.append((sid, session, amount, hours, days, sc.generate_payment_hash(sid, session)))
+    return priced
+
+
+def _size(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def _work_size(pid, since, until):
+    size = _size(session_store.hot_file(pid))
+    for month, _ in session_store.partitions_for(pid, since, until):
+        size += _size(session_store.partition_file(pid, month))
+    return size
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # the server is threaded, so workers are spawned rather than forked
+        _pool = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def priced_lots(since=None, until=None, user=None):
+    """Yield (lot id, lot, priced sessions) for every lot, in lot order."""
+    lots = list(read_snapshot('data/parking-lots.json').items())
+    rules = discounts.current()
+    parallel = WORKERS > 0 and len(lots) > 1 and sum(_work_size(pid, since, until) for pid, _ in lots) >= PARALLEL_BYTES
+    if not parallel:
+        for pid, parkinglot in lots:
+            yield pid, parkinglot, _price_lot(pid, parkinglot, since, until, user, rules)
+        return
+    pool = _get_pool()
+    futures = [None if is_pending(session_store.hot_file(pid)) else pool.submit(_price_lot, pid, parkinglot, since, until, user, rules)
+               for pid, parkinglot in lots]
+    for (pid, parkinglot), future in zip(lots, futures):
+        yield pid, parkinglot, future.result() if future else _price_lot(pid, parkinglot, since, until, user, rules)
+
+
+def user_billing(user, since=None, until=None):
+    data = []
+    for pid, parkinglot, priced in priced_lots(since, until, user):
+        parking = {k: v for k, v in parkinglot.items() if k in ["name", "location", "tariff", "daytariff", "schedule"]}
+        for sid, session, amount, hours, days, thash in priced:
+            data.append({
+                "session": {k: v for k, v in session.items() if k in ["licenseplate", "started", "stopped"]} | {"hours": hours, "days": days},
+                "parking": parking,
+                "amount": amount,
+                "thash": thash
+            })
+    payed = sc.check_payment_amounts({row["thash"] for row in data})
+    for row in data:
+        row["payed"] = payed[row["thash"]]
+        row["balance"] = row["amount"] - row["payed"]
+    return data
+
+
+def export_rows(since=None, until=None):
+    """Yield a flat billing row for every session of every user, reading each
+    lot's sessions once and the payments once."""
+    payed = sc.payment_totals()
+    for pid, parkinglot, priced in priced_lots(since, until):
+        for sid, session, amount, hours, days, thash in priced:
+            total = payed.get(thash, 0)
+            yield {
+                "user": session.get("user"),
+                "lot": pid,
+                "session": sid,
+                "licenseplate": session.get("licenseplate"),
+                "started": session.get("started"),
+                "stopped": session.get("stopped"),
+                "hours": hours,
+                "days": days,
+                "amount": amount,
+                "payed": total,
+                "balance": amount - total,
+                "thash": thash
+            }
+
+
+def export_chunks(rows, format, chunk_size=1 << 16):
+    buffer = io.StringIO()
+    if format == "jsonl":
+        write = lambda row: buffer.write(json.dumps(row, default=str) + "\n")
+    else:
+        writer = csv.DictWriter(buffer, EXPORT_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        write = writer.writerow
+    for row in rows:
+        write(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
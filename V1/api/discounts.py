@@ -0,0 +1,95 @@
+"""Discount rules from data/discounts.csv.
+
+The file starts with a header row naming its columns:
+
+    code,user,lot,percentage,amount,valid_from,valid_until
+
+A rule takes `percentage` percent and then `amount` off the price of a
+session started between `valid_from` and `valid_until` (YYYY-MM-DD, both
+inclusive). Blank columns match anything. A rule with a `code` only applies
+to sessions started with that discount code. When several rules match, the
+one giving the lowest price wins.
+
+`current` parses the file into rules indexed by code and by (user, lot) and
+keeps them until the file changes, so finding a session's discount is a
+handful of dict lookups.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from storage_utils import load_discounts_data
+
+DISCOUNTS_FILE = 'data/discounts.csv'
+
+_state = {"mtime": None, "discounts": None}
+_lock = threading.Lock()
+
+
+class Discounts:
+    def __init__(self, rules):
+        self.codes = {}
+        self.rules = {}
+        for rule in rules:
+            if rule["code"]:
+                self.codes.setdefault(rule["code"], []).append(rule)
+            else:
+                self.rules.setdefault((rule["user"], rule["lot"]), []).append(rule)
+
+    def _candidates(self, user, lid, code):
+        if code:
+            yield from self.codes.get(code, [])
+        for key in ((user, lid), (user, ""), ("", lid), ("", "")):
+            yield from self.rules.get(key, [])
+
+    def apply(self, price, user, lid, code, started):
+        best = price
+        for rule in self._candidates(user or "", str(lid or ""), code):
+            if rule["code"] and (rule["user"] not in ("", user) or rule["lot"] not in ("", str(lid or ""))):
+                continue
+            if (rule["valid_from"] and started < rule["valid_from"]) or (rule["valid_until"] and started > rule["valid_until"]):
+                continue
+            best = min(best, max(0, price * (100 - rule["percentage"]) / 100 - rule["amount"]))
+        return round(best, 2) if best != price else price
+
+
+def _parse_date(value, end=False):
+    if not value:
+        return None
+    date = datetime.strptime(value, "%Y-%m-%d")
+    return date + timedelta(days=1, seconds=-1) if end else date
+
+
+def _parse(rows):
+    if not rows:
+        return []
+    header = [name.strip() for name in rows[0]]
+    rules = []
+    for row in rows[1:]:
+        if not any(value.strip() for value in row):
+            continue
+        values = dict(zip(header, (value.strip() for value in row)))
+        try:
+            rules.append({
+                "code": values.get("code", ""),
+                "user": values.get("user", ""),
+                "lot": values.get("lot", ""),
+                "percentage": float(values.get("percentage") or 0),
+                "amount": float(values.get("amount") or 0),
+                "valid_from": _parse_date(values.get("valid_from")),
+                "valid_until": _parse_date(values.get("valid_until"), end=True)
+            })
+        except ValueError:
+            continue
+    return rules
+
+
+def current():
+    try:
+        mtime = os.stat(DISCOUNTS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with _lock:
+        if _state["discounts"] is None or _state["mtime"] != mtime:
+            _state["discounts"] = Discounts(_parse(load_discounts_data()) if mtime is not None else [])
+            _state["mtime"] = mtime
+        return _state["discounts"]
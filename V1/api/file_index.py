@@ -0,0 +1,71 @@
+"""Lookup indexes over data files, rebuilt when the files change.
+
+A `FileIndex` keeps its lookup tables in `state`, next to the mtimes of the
+files they were built from. `ensure` rebuilds the tables whenever one of those
+files has changed since, so edits made outside the handlers - by hand or by
+another process such as archive_job - are picked up on the next lookup. The
+handlers that write the files update the tables in place and then call
+`saved`, which records the new mtimes so their own write does not cause a
+rebuild. A deferred save (see storage_utils) is recorded as pending, and the
+mtime the file gets when it is flushed counts as unchanged.
+`state` and `lock` are what snapshot.py saves and restores.
+"""
+import os
+import threading
+import storage_utils
+
+PENDING = "pending"
+
+
+def mtime(filename):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _version(filename):
+    return PENDING if storage_utils.is_pending(filename) else mtime(filename)
+
+
+class FileIndex:
+    def __init__(self, files, build, **tables):
+        # files: a list of filenames, or a function returning the current list
+        self.files = files
+        self._build = build
+        self.state = dict(tables, mtime=None)
+        self.lock = threading.Lock()
+
+    def _versions(self):
+        files = self.files() if callable(self.files) else self.files
+        return {filename: _version(filename) for filename in files}
+
+    def _unchanged(self, versions):
+        recorded = self.state["mtime"]
+        if recorded is None or recorded.keys() != versions.keys():
+            return False
+        for filename, version in versions.items():
+            then = recorded[filename]
+            if version != then and not (then == PENDING and version == storage_utils.written_mtime(filename)):
+                return False
+        return True
+
+    @property
+    def built(self):
+        return self.state["mtime"] is not None
+
+    def ensure(self):
+        """Rebuild the tables if any file changed, and return the state. Call with `lock` held."""
+        versions = self._versions()
+        if not self._unchanged(versions):
+            self.state.update(self._build())
+        self.state["mtime"] = versions
+        return self.state
+
+    def saved(self):
+        """Record the current mtimes, after a handler wrote the files and updated the tables."""
+        self.state["mtime"] = self._versions()
+
+    def invalidate(self):
+        """Drop the tables; the next lookup rebuilds them."""
+        self.state["mtime"] = None
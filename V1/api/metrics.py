@@ -0,0 +1,133 @@
+import threading
+from bisect import bisect_left
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ROUTE_WORDS = {
+    "register", "login", "logout", "profile", "parking-lots", "sessions", "start", "stop",
+    "reservations", "vehicles", "entry", "history", "payments", "refund", "bulk", "billing",
+    "metrics", "admin", "profiles", "export", "events", "archive"
+}
+METHODS = {"GET", "POST", "PUT", "DELETE"}
+
+_lock = threading.Lock()
+_durations = {}
+_statuses = {}
+_request_bytes = {}
+_response_bytes = {}
+_storage = {}
+_queue_depths = {}
+_queue_waits = {}
+
+
+def route_for(path):
+    parts = path.split("?", 1)[0].split("/")
+    return "/".join(part if not part or part in ROUTE_WORDS else "{id}" for part in parts)
+
+
+def method_for(method):
+    # the method comes from the client, so anything else is one label value
+    return method if method in METHODS else "other"
+
+
+def observe_request(method, path, status, seconds, request_bytes, response_bytes):
+    key = (method_for(method), route_for(path))
+    with _lock:
+        histogram = _durations.get(key)
+        if histogram is None:
+            histogram = _durations[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        skey = key + (str(status),)
+        _statuses[skey] = _statuses.get(skey, 0) + 1
+        _request_bytes[key] = _request_bytes.get(key, 0) + request_bytes
+        _response_bytes[key] = _response_bytes.get(key, 0) + response_bytes
+
+
+def observe_storage(operation, filename, seconds):
+    key = (operation, filename)
+    with _lock:
+        entry = _storage.get(key)
+        if entry is None:
+            entry = _storage[key] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def observe_queue_depth(route_class, depth):
+    with _lock:
+        _queue_depths[route_class] = depth
+
+
+def observe_queue_wait(route_class, seconds):
+    with _lock:
+        histogram = _queue_waits.get(route_class)
+        if histogram is None:
+            histogram = _queue_waits[route_class] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render():
+    with _lock:
+        durations = {k: ([*v[0]], v[1]) for k, v in _durations.items()}
+        statuses = dict(_statuses)
+        request_bytes = dict(_request_bytes)
+        response_bytes = dict(_response_bytes)
+        storage = {k: tuple(v) for k, v in _storage.items()}
+        queue_depths = dict(_queue_depths)
+        queue_waits = {k: ([*v[0]], v[1]) for k, v in _queue_waits.items()}
+
+    lines = [
+        "# HELP parking_http_request_duration_seconds Time spent handling a request.",
+        "# TYPE parking_http_request_duration_seconds histogram"
+    ]
+    for (method, route), (counts, total) in sorted(durations.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"parking_http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"parking_http_request_duration_seconds_sum{_labels(method=method, route=route)} {total}")
+        lines.append(f"parking_http_request_duration_seconds_count{_labels(method=method, route=route)} {cumulative}")
+
+    lines += ["# HELP parking_http_responses_total Responses sent by status code.", "# TYPE parking_http_responses_total counter"]
+    for (method, route, status), count in sorted(statuses.items()):
+        lines.append(f"parking_http_responses_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines += ["# HELP parking_http_request_bytes_total Request body bytes received.", "# TYPE parking_http_request_bytes_total counter"]
+    for (method, route), count in sorted(request_bytes.items()):
+        lines.append(f"parking_http_request_bytes_total{_labels(method=method, route=route)} {count}")
+
+    lines += ["# HELP parking_http_response_bytes_total Response bytes sent.", "# TYPE parking_http_response_bytes_total counter"]
+    for (method, route), count in sorted(response_bytes.items()):
+        lines.append(f"parking_http_response_bytes_total{_labels(method=method, route=route)} {count}")
+
+    lines += ["# HELP parking_storage_operations_total Data file loads and saves.", "# TYPE parking_storage_operations_total counter"]
+    for (operation, filename), (count, _) in sorted(storage.items()):
+        lines.append(f"parking_storage_operations_total{_labels(operation=operation, file=filename)} {count}")
+
+    lines += ["# HELP parking_storage_duration_seconds_total Time spent loading and saving data files.", "# TYPE parking_storage_duration_seconds_total counter"]
+    for (operation, filename), (_, seconds) in sorted(storage.items()):
+        lines.append(f"parking_storage_duration_seconds_total{_labels(operation=operation, file=filename)} {seconds}")
+
+    lines += ["# HELP parking_queue_depth Connections waiting for a worker, by request class.", "# TYPE parking_queue_depth gauge"]
+    for route_class, depth in sorted(queue_depths.items()):
+        lines.append(f"parking_queue_depth{_labels(route_class=route_class)} {depth}")
+
+    lines += ["# HELP parking_queue_wait_seconds Time connections waited for a worker.", "# TYPE parking_queue_wait_seconds histogram"]
+    for route_class, (counts, total) in sorted(queue_waits.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"parking_queue_wait_seconds_bucket{_labels(route_class=route_class, le=bound)} {cumulative}")
+        lines.append(f"parking_queue_wait_seconds_sum{_labels(route_class=route_class)} {total}")
+        lines.append(f"parking_queue_wait_seconds_count{_labels(route_class=route_class)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,96 @@
+"""Live lot occupancy for Server-Sent Events subscribers.
+
+Every lot has one channel holding only its latest occupancy event, encoded
+once. Publishing replaces that event and wakes the lot's subscribers; it
+never touches a socket, so session handlers are not slowed down by clients.
+Each subscriber sends whatever is latest when it wakes up and then waits at
+least PARKING_EVENTS_INTERVAL seconds (default 0.5) before sending again.
+Bursts of changes therefore reach a client as a single event, and a slow
+client skips the states it was too slow for. A comment line is sent after
+PARKING_EVENTS_HEARTBEAT seconds (default 15) without changes, so idle
+connections stay open. A client that cannot take a write within
+PARKING_EVENTS_WRITE_TIMEOUT seconds (default 10) is disconnected.
+"""
+import json
+import os
+import threading
+import time
+from storage_utils import read_snapshot
+
+INTERVAL = float(os.environ.get("PARKING_EVENTS_INTERVAL", 0.5))
+HEARTBEAT = float(os.environ.get("PARKING_EVENTS_HEARTBEAT", 15))
+WRITE_TIMEOUT = float(os.environ.get("PARKING_EVENTS_WRITE_TIMEOUT", 10))
+
+_channels = {}
+_lock = threading.Lock()
+
+
+class Channel:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.payload = None
+        self.state = {}
+
+
+def _channel(lid):
+    with _lock:
+        channel = _channels.get(lid)
+        if channel is None:
+            channel = _channels[lid] = Channel()
+        return channel
+
+
+def _occupancy(lid, parkinglot, occupied):
+    capacity = int(parkinglot.get("capacity") or 0)
+    reserved = int(parkinglot.get("reserved") or 0)
+    return {
+        "lot": lid,
+        "capacity": capacity,
+        "occupied": occupied,
+        "reserved": reserved,
+        "available": max(0, capacity - occupied - reserved)
+    }
+
+
+def publish(lid, parkinglot, occupied=None):
+    """Replace the lot's latest event. Without `occupied` the last known count is kept."""
+    channel = _channel(lid)
+    with channel.condition:
+        if occupied is None:
+            occupied = channel.state.get("occupied")
+            if occupied is None:
+                return
+        state = _occupancy(lid, parkinglot, occupied)
+        if state == channel.state:
+            return
+        channel.state = state
+        channel.version += 1
+        channel.payload = f"id: {channel.version}\nevent: occupancy\ndata: {json.dumps(state)}\n\n".encode("utf-8")
+        channel.condition.notify_all()
+
+
+def sessions_changed(lid, sessions):
+    parkinglot = read_snapshot('data/parking-lots.json').get(lid)
+    if parkinglot is not None:
+        publish(lid, parkinglot, sum(1 for session in sessions.values() if not session.get("stopped")))
+
+
+def events(lid, parkinglot, count_occupied):
+    """Yield the encoded latest event of a lot each time it changes, or None
+    after HEARTBEAT seconds without a change."""
+    channel = _channel(lid)
+    if channel.payload is None:
+        publish(lid, parkinglot, count_occupied())
+    seen = 0
+    while True:
+        with channel.condition:
+            if channel.version == seen:
+                channel.condition.wait(HEARTBEAT)
+            version, payload = channel.version, channel.payload
+        if version == seen:
+            yield None
+            continue
+        seen = version
+        yield payload
+        time.sleep(INTERVAL)
@@ -0,0 +1,128 @@
+"""Archive of completed payments in compressed segment files.
+
+`archive_payments` moves completed payments created before the retention
+window out of data/payments.json into a new, never rewritten segment under
+data/archive/. data/archive/payments-manifest.json lists the segments with
+their min/max creation time and a bloom filter of the users involved.
+"""
+import os
+from datetime import datetime, timedelta
+from storage_utils import write_lock, read_snapshot, load_json, save_data, save_payment_data
+import archive_segments as seg
+
+ARCHIVE_DIR = 'data/archive'
+MANIFEST_FILE = f'{ARCHIVE_DIR}/payments-manifest.json'
+PAYMENTS_FILE = 'data/payments.json'
+PAYMENT_FIELDS = ["transaction", "amount", "initiator", "processed_by", "coupled_to", "created_at", "completed", "hash", "t_data"]
+
+_totals = {"mtime": None, "totals": {}}
+
+
+def parse_payment_time(value):
+    # created_at has been written as "%d-%m-%Y %H:%I:%s", where %s is the unix time
+    try:
+        return datetime.strptime(value, "%d-%m-%Y %H:%M:%S")
+    except (TypeError, ValueError):
+        pass
+    try:
+        date, clock = value.split(" ")
+        seconds = clock.split(":")[-1]
+        if len(seconds) > 2:
+            return datetime.fromtimestamp(int(seconds))
+        return datetime.strptime(date, "%d-%m-%Y")
+    except (AttributeError, ValueError):
+        return None
+
+
+def load_manifest():
+    return load_json(MANIFEST_FILE) or {"segments": []}
+
+
+def archive_payments(keep_days=30, now=None):
+    """Move completed payments created before the retention window into a new
+    segment. The segment is written without write_lock; it is only held to
+    drop the moved payments from payments.json and save the manifest. When a
+    moved payment was changed in the meantime nothing is archived; the next
+    run retries."""
+    cutoff = (now or datetime.now()) - timedelta(days=keep_days)
+    moved = {}
+    for position, payment in enumerate(read_snapshot(PAYMENTS_FILE) or []):
+        created = parse_payment_time(payment.get("created_at"))
+        if payment.get("completed") and created and created < cutoff:
+            moved[position] = (seg.to_seconds(created), payment)
+    if not moved:
+        return 0
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    rows = list(moved.values())
+    columns = {field: [payment.get(field) for _, payment in rows] for field in PAYMENT_FIELDS}
+    columns["time"] = [created for created, _ in rows]
+    columns["extra"] = [{k: v for k, v in payment.items() if k not in PAYMENT_FIELDS} or None for _, payment in rows]
+    name = f"payments-{len(load_manifest()['segments']) + 1:05d}.seg"
+    min_time, max_time = min(columns["time"]), max(columns["time"])
+    seg.write_segment(f'{ARCHIVE_DIR}/{name}', "payments", columns, min_time, max_time)
+    users = seg.bloom([u for u in columns["initiator"] + columns["processed_by"] if u])
+
+    with write_lock:
+        # payments are only ever appended, or changed in place
+        payments = read_snapshot(PAYMENTS_FILE) or []
+        if any(position >= len(payments) or payments[position] != payment for position, (_, payment) in moved.items()):
+            os.remove(f'{ARCHIVE_DIR}/{name}')
+            return 0
+        manifest = load_manifest()
+        manifest["segments"].append({
+            "file": name,
+            "count": len(moved),
+            "min_time": min_time,
+            "max_time": max_time,
+            "users": users
+        })
+        save_data(MANIFEST_FILE, manifest)
+        save_payment_data([payment for position, payment in enumerate(payments) if position not in moved])
+    return len(moved)
+
+
+def _from_row(row):
+    payment = {field: row[field] for field in PAYMENT_FIELDS if row[field] is not None}
+    if row["extra"]:
+        payment.update(row["extra"])
+    return payment
+
+
+def segment_payments(name, rows):
+    """Return {row: payment} for the given row numbers of one segment."""
+    columns = seg.read_columns(f'{ARCHIVE_DIR}/{name}', PAYMENT_FIELDS + ["extra"])
+    return {row: _from_row({field: values[row] for field, values in columns.items()}) for row in set(rows)}
+
+
+def archived_payments(user=None, since=None, until=None):
+    low = seg.to_seconds(since) if since is not None else None
+    high = seg.to_seconds(until) if until is not None else None
+    for info in load_manifest()["segments"]:
+        if (low is not None and info["max_time"] < low) or (high is not None and info["min_time"] > high):
+            continue
+        if user is not None and not seg.might_contain(info["users"], user):
+            continue
+        filters = {}
+        if low is not None or high is not None:
+            filters["time"] = lambda value: (low is None or value >= low) and (high is None or value <= high)
+        if user is not None:
+            filters[("initiator", "processed_by")] = lambda initiator, processed_by: user in (initiator, processed_by)
+        for row in seg.read_rows(f'{ARCHIVE_DIR}/{info["file"]}', filters):
+            yield _from_row(row)
+
+
+def archived_totals():
+    try:
+        mtime = os.stat(MANIFEST_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _totals["mtime"] != mtime:
+        totals = {}
+        for info in load_manifest()["segments"]:
+            columns = seg.read_columns(f'{ARCHIVE_DIR}/{info["file"]}', ["transaction", "amount"])
+            for transaction, amount in zip(columns["transaction"], columns["amount"]):
+                totals[transaction] = totals.get(transaction, 0) + amount
+        _totals["totals"] = totals
+        _totals["mtime"] = mtime
+    return _totals["totals"]
@@ -0,0 +1,89 @@
+from bisect import insort
+from heapq import merge
+from itertools import islice
+from storage_utils import read_snapshot
+import payment_archive
+import archive_segments as seg
+from file_index import FileIndex
+
+PAYMENTS_FILE = "data/payments.json"
+USER_FIELDS = ("initiator", "processed_by")
+
+# users: username -> [(created seconds, position in payments.json)], sorted
+# archived: username -> [(created seconds, segment file, row)], sorted
+# Covers the payments a user initiated and the refunds they processed, both
+# live and archived by archive_job. The handlers that write payments.json keep
+# the index current; archiving changes payments.json and the archive manifest,
+# so the index is rebuilt after it.
+
+
+def _created(payment):
+    created = payment_archive.parse_payment_time(payment.get("created_at"))
+    # payments without a readable creation time sort before all others
+    return seg.to_seconds(created) if created is not None else -1
+
+
+def _link(users, position, payment):
+    entry = (_created(payment), position)
+    for user in {payment.get(field) for field in USER_FIELDS}:
+        if user:
+            insort(users.setdefault(user, []), entry)
+
+
+def _build():
+    payments = read_snapshot(PAYMENTS_FILE) or []
+    users = {}
+    for position, payment in enumerate(payments):
+        _link(users, position, payment)
+    archived = {}
+    for info in payment_archive.load_manifest()["segments"]:
+        # only the user and time columns are inflated; rows are read when listed
+        columns = seg.read_columns(f'{payment_archive.ARCHIVE_DIR}/{info["file"]}', ["time", *USER_FIELDS])
+        for row, created in enumerate(columns["time"]):
+            for user in {columns[field][row] for field in USER_FIELDS}:
+                if user:
+                    insort(archived.setdefault(user, []), (created, info["file"], row))
+    return {"count": len(payments), "users": users, "archived": archived}
+
+
+_index = FileIndex([PAYMENTS_FILE, payment_archive.MANIFEST_FILE], _build, count=0, users={}, archived={})
+_state = _index.state
+
+
+def for_user(username, offset=0, limit=50):
+    """Return (total, payments) for a user, newest first, as one page."""
+    with _index.lock:
+        _index.ensure()
+        payments = read_snapshot(PAYMENTS_FILE) or []
+        live = _state["users"].get(username, [])
+        archived = _state["archived"].get(username, [])
+        refs = list(islice(merge(reversed(live), reversed(archived), key=lambda ref: ref[0], reverse=True), offset, offset + limit))
+        segments = {}
+        for ref in refs:
+            if len(ref) == 3:
+                segments.setdefault(ref[1], []).append(ref[2])
+        rows = {name: payment_archive.segment_payments(name, wanted) for name, wanted in segments.items()}
+        page = [payments[ref[1]] if len(ref) == 2 else rows[ref[1]][ref[2]] for ref in refs]
+        return len(live) + len(archived), page
+
+
+def appended(payments):
+    """Record the payments added to the end of the list, after payments.json was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        if len(payments) < _state["count"]:
+            _index.invalidate()
+            return
+        for position in range(_state["count"], len(payments)):
+            _link(_state["users"], position, payments[position])
+        _state["count"] = len(payments)
+        _index.saved()
+
+
+def updated():
+    """Note that payments were changed in place, after payments.json was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _index.saved()
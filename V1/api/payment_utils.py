@@ -0,0 +1,61 @@
+from datetime import datetime
+import session_calculator as sc
+import schemas
+
+
+def index_by_transaction(payments):
+    index = {}
+    for payment in payments:
+        index.setdefault(payment["transaction"], []).append(payment)
+    return index
+
+
+def _failed(i, invalid):
+    # the same status and error body a single-item route would have sent
+    code, error = invalid
+    return dict(error, index=i, status="Failed", code=code)
+
+
+def create_payments(items, username):
+    created = []
+    results = []
+    for i, item in enumerate(items):
+        invalid = schemas.VALIDATORS["payment"](item)
+        if invalid:
+            results.append(_failed(i, invalid))
+            continue
+        payment = {
+            "transaction": item.get("transaction"),
+            "amount": item.get("amount", 0),
+            "initiator": username,
+            "created_at": datetime.now().strftime("%d-%m-%Y %H:%I:%s"),
+            "completed": False,
+            "hash": sc.generate_transaction_validation_hash()
+        }
+        created.append(payment)
+        results.append({"index": i, "status": "Success", "payment": payment})
+    return created, results
+
+
+def complete_payments(payments, items):
+    index = index_by_transaction(payments)
+    completed = 0
+    results = []
+    for i, item in enumerate(items):
+        invalid = schemas.VALIDATORS["payment_completion"](item)
+        if invalid:
+            results.append(_failed(i, invalid))
+            continue
+        candidates = index.get(item["transaction"])
+        if not candidates:
+            results.append({"index": i, "transaction": item["transaction"], "status": "Failed", "error": "Payment not found"})
+            continue
+        payment = next((p for p in candidates if p["hash"] == item["validation"]), None)
+        if payment is None:
+            results.append({"index": i, "transaction": item["transaction"], "status": "Failed", "error": "Validation failed"})
+            continue
+        payment["completed"] = datetime.now().strftime("%d-%m-%Y %H:%I:%s")
+        payment["t_data"] = item.get("t_data", {})
+        completed += 1
+        results.append({"index": i, "transaction": item["transaction"], "status": "Success", "payment": payment})
+    return completed, results
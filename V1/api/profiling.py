@@ -0,0 +1,68 @@
+import cProfile
+import os
+import random
+import threading
+from datetime import datetime
+import metrics
+
+# Profiling is off unless PARKING_PROFILE_RATE (0..1) samples requests, or an
+# ADMIN sends the X-Profile header. Only one request is profiled at a time.
+PROFILE_DIR = os.environ.get("PARKING_PROFILE_DIR", "data/profiles")
+SAMPLE_RATE = float(os.environ.get("PARKING_PROFILE_RATE", 0))
+KEEP = int(os.environ.get("PARKING_PROFILE_KEEP", 50))
+ROUTES = {route for route in os.environ.get("PARKING_PROFILE_ROUTES", "").split(",") if route}
+
+_busy = threading.Lock()
+
+
+def begin(path, requested=False):
+    if not requested:
+        if not SAMPLE_RATE or random.random() >= SAMPLE_RATE:
+            return None
+        if ROUTES and metrics.route_for(path) not in ROUTES:
+            return None
+    if not _busy.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def end(profiler, method, path, seconds):
+    try:
+        profiler.disable()
+        slug = metrics.route_for(path).strip("/").replace("/", ".").replace("{id}", "id") or "root"
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S.%f')}_{method}_{slug}_{int(seconds * 1000)}ms.prof"
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        _rotate()
+    finally:
+        _busy.release()
+
+
+def _rotate():
+    names = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".prof"))
+    for name in names[:max(0, len(names) - KEEP)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles(limit=KEEP):
+    try:
+        names = sorted((name for name in os.listdir(PROFILE_DIR) if name.endswith(".prof")), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names[:limit]:
+        stamp, method, slug, duration = name[:-len(".prof")].split("_", 3)
+        profiles.append({
+            "file": name,
+            "created": datetime.strptime(stamp, "%Y%m%dT%H%M%S.%f").strftime("%d-%m-%Y %H:%M:%S"),
+            "method": method,
+            "route": "/" + slug.replace(".", "/").replace("/id", "/{id}") if slug != "root" else "/",
+            "duration_ms": int(duration[:-2]),
+            "size": os.path.getsize(os.path.join(PROFILE_DIR, name))
+        })
+    return profiles
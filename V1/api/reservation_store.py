@@ -0,0 +1,113 @@
+from storage_utils import read_snapshot, load_json, save_data
+from session_store import normalize_plate
+from file_index import FileIndex
+
+RESERVATIONS_FILE = "data/reservations.json"
+
+# reservations: id -> reservation
+# users / lots / plates: username, lot id or normalized plate -> {id: reservation}
+# The handlers that write reservations.json keep the indexes current.
+
+INDEXES = {
+    "users": lambda reservation: reservation.get("user"),
+    "lots": lambda reservation: reservation.get("parkinglot"),
+    "plates": lambda reservation: normalize_plate(reservation["licenseplate"]) if reservation.get("licenseplate") else None
+}
+
+
+def _as_map(data):
+    # reservations.json used to be a list, with ids only inside the records
+    if isinstance(data, list):
+        return {str(reservation.get("id", i + 1)): reservation for i, reservation in enumerate(data)}
+    return data or {}
+
+
+def load_reservations():
+    return _as_map(load_json(RESERVATIONS_FILE))
+
+
+def save_reservations(reservations):
+    save_data(RESERVATIONS_FILE, reservations)
+
+
+def next_reservation_id(reservations):
+    return str(max([int(rid) for rid in reservations if rid.isdigit()] + [0]) + 1)
+
+
+def _link(tables, rid, reservation):
+    tables["reservations"][rid] = reservation
+    for name, key_of in INDEXES.items():
+        key = key_of(reservation)
+        if key is not None:
+            tables[name].setdefault(key, {})[rid] = reservation
+
+
+def _build():
+    tables = {"reservations": {}, "users": {}, "lots": {}, "plates": {}}
+    for rid, reservation in _as_map(read_snapshot(RESERVATIONS_FILE)).items():
+        _link(tables, rid, reservation)
+    return tables
+
+
+_index = FileIndex([RESERVATIONS_FILE], _build, reservations={}, users={}, lots={}, plates={})
+_state = _index.state
+
+
+def _unlink(rid):
+    reservation = _state["reservations"].pop(rid, None)
+    if reservation is None:
+        return
+    for name, key_of in INDEXES.items():
+        entries = _state[name].get(key_of(reservation))
+        if entries is not None:
+            entries.pop(rid, None)
+            if not entries:
+                del _state[name][key_of(reservation)]
+
+
+def _sorted(entries):
+    return [entries[rid] for rid in sorted(entries, key=lambda rid: (len(rid), rid))]
+
+
+def get(rid):
+    with _index.lock:
+        _index.ensure()
+        return _state["reservations"].get(rid)
+
+
+def for_user(username):
+    with _index.lock:
+        _index.ensure()
+        return _sorted(_state["users"].get(username, {}))
+
+
+def for_lot(lid):
+    with _index.lock:
+        _index.ensure()
+        return _sorted(_state["lots"].get(lid, {}))
+
+
+def for_plate(licenseplate, username=None):
+    with _index.lock:
+        _index.ensure()
+        entries = _state["plates"].get(normalize_plate(licenseplate), {})
+        return _sorted({rid: r for rid, r in entries.items() if username is None or r.get("user") == username})
+
+
+def upsert(rid, reservation):
+    """Record a created or updated reservation, after reservations.json was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _unlink(rid)
+        _link(_state, rid, reservation)
+        _index.saved()
+
+
+def remove(rid):
+    """Forget a deleted reservation, after reservations.json was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _unlink(rid)
+        _index.saved()
@@ -0,0 +1,193 @@
+"""Per-class worker pools for incoming connections.
+
+The server handles one request per connection. Instead of a thread per
+connection, an accepted connection is handed to a dispatcher thread that
+waits until the request line has arrived, peeks at it without consuming it
+(MSG_PEEK) and queues the connection on the pool of its class (see
+admission.route_class). Each pool runs at most `workers` threads, started
+on demand, and holds at most `queue` connections waiting for one of them,
+as configured by PARKING_LIMIT_<CLASS>.
+
+A connection that finds its pool's queue full, or that waits longer than
+PARKING_QUEUE_TIMEOUT seconds (default 5) for a worker, is answered with
+503 and Retry-After. Connections that send nothing within
+PARKING_HEADER_TIMEOUT seconds (default 10) are closed, and once a worker
+has a connection, every read of its headers and body times out after as
+long. Queue depth and wait time per class are exported by metrics.
+"""
+import collections
+import json
+import math
+import os
+import selectors
+import socket
+import threading
+import time
+import admission
+import metrics
+
+QUEUE_TIMEOUT = float(os.environ.get("PARKING_QUEUE_TIMEOUT", 5))
+HEADER_TIMEOUT = float(os.environ.get("PARKING_HEADER_TIMEOUT", 10))
+PEEK_BYTES = 2048
+
+
+def _request_line(data):
+    parts = data.split(b"\n", 1)[0].split()
+    if len(parts) < 2:
+        return None, ""
+    return parts[0].decode("latin-1"), parts[1].decode("latin-1")
+
+
+def _refuse(server, request, method, path, status, reason, retry_after, error):
+    body = json.dumps({"error": error, "field": None}).encode("utf-8")
+    response = (
+        f"HTTP/1.0 {status} {reason}\r\n"
+        "Content-type: application/json\r\n"
+        f"Retry-After: {retry_after}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode("latin-1") + body
+    try:
+        # read what the client already sent, so closing does not reset the connection
+        request.setblocking(False)
+        try:
+            request.recv(65536)
+        except OSError:
+            pass
+        request.setblocking(True)
+        request.settimeout(1)
+        request.sendall(response)
+    except OSError:
+        pass
+    server.shutdown_request(request)
+    if method:
+        metrics.observe_request(method, path, status, 0.0, 0, len(response))
+
+
+class Pool:
+    def __init__(self, server, name, workers, queue):
+        self.server = server
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.threads = 0
+        self.idle = 0
+        self.waiting = collections.deque()
+        self.condition = threading.Condition()
+
+    def submit(self, request, client_address, method, path):
+        with self.condition:
+            busy = self.threads - self.idle
+            if len(self.waiting) >= self.workers - busy + self.queue:
+                full = True
+            else:
+                full = False
+                self.waiting.append((request, client_address, method, path, time.monotonic()))
+                if self.idle < len(self.waiting) and self.threads < self.workers:
+                    self.threads += 1
+                    threading.Thread(target=self._work, name=f"{self.name}-worker-{self.threads}", daemon=True).start()
+                else:
+                    self.condition.notify()
+            depth = len(self.waiting)
+        metrics.observe_queue_depth(self.name, depth)
+        if full:
+            _refuse(self.server, request, method, path, 503, "Service Unavailable", math.ceil(QUEUE_TIMEOUT), "Server busy")
+
+    def expire(self):
+        deadline = time.monotonic() - QUEUE_TIMEOUT
+        with self.condition:
+            expired = [item for item in self.waiting if item[4] < deadline]
+            if not expired:
+                return
+            self.waiting = collections.deque(item for item in self.waiting if item[4] >= deadline)
+            depth = len(self.waiting)
+        metrics.observe_queue_depth(self.name, depth)
+        for request, client_address, method, path, queued in expired:
+            metrics.observe_queue_wait(self.name, time.monotonic() - queued)
+            _refuse(self.server, request, method, path, 503, "Service Unavailable", math.ceil(QUEUE_TIMEOUT), "Server busy")
+
+    def _work(self):
+        while True:
+            with self.condition:
+                self.idle += 1
+                while not self.waiting:
+                    self.condition.wait()
+                self.idle -= 1
+                request, client_address, method, path, queued = self.waiting.popleft()
+                depth = len(self.waiting)
+            waited = time.monotonic() - queued
+            metrics.observe_queue_depth(self.name, depth)
+            metrics.observe_queue_wait(self.name, waited)
+            if waited > QUEUE_TIMEOUT:
+                _refuse(self.server, request, method, path, 503, "Service Unavailable", math.ceil(QUEUE_TIMEOUT), "Server busy")
+                continue
+            try:
+                self.server.finish_request(request, client_address)
+            except Exception:
+                self.server.handle_error(request, client_address)
+            finally:
+                self.server.shutdown_request(request)
+
+
+class SchedulingMixIn:
+    """Mix-in for socketserver servers that hands connections to per-class pools."""
+
+    def server_activate(self):
+        super().server_activate()
+        self.pools = {name: Pool(self, name, limits[2], limits[3]) for name, limits in admission.LIMITS.items()}
+        self._selector = selectors.DefaultSelector()
+        self._incoming = []
+        self._incoming_lock = threading.Lock()
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._wake_read.setblocking(False)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+        threading.Thread(target=self._dispatch, name="dispatcher", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        with self._incoming_lock:
+            self._incoming.append((request, client_address))
+        self._wake_write.send(b"\0")
+
+    def _dispatch(self):
+        pending = {}
+        while True:
+            for key, _ in self._selector.select(1.0):
+                if key.fileobj is self._wake_read:
+                    try:
+                        self._wake_read.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    with self._incoming_lock:
+                        incoming, self._incoming = self._incoming, []
+                    now = time.monotonic()
+                    for request, client_address in incoming:
+                        pending[request] = (client_address, now)
+                        self._selector.register(request, selectors.EVENT_READ)
+                    continue
+                request = key.fileobj
+                client_address, _ = pending.pop(request)
+                self._selector.unregister(request)
+                try:
+                    self._route(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                    self.shutdown_request(request)
+            now = time.monotonic()
+            for request in [r for r, (_, accepted) in pending.items() if now - accepted > HEADER_TIMEOUT]:
+                del pending[request]
+                self._selector.unregister(request)
+                self.shutdown_request(request)
+            for pool in self.pools.values():
+                pool.expire()
+
+    def _route(self, request, client_address):
+        try:
+            data = request.recv(PEEK_BYTES, socket.MSG_PEEK)
+        except OSError:
+            data = b""
+        if not data:
+            self.shutdown_request(request)
+            return
+        # a request line split over several packets is classified by its first one;
+        # at worst an unfinished path lands in the interactive class
+        method, path = _request_line(data)
+        self.pools[admission.route_class(method, path)].submit(request, client_address, method, path)
@@ -0,0 +1,131 @@
+"""Request body schemas.
+
+Every schema maps a field name to `required(...)` or `optional(...)` with
+the json types the field may have and, for strings and lists, a maximum
+length. `compile_schema` turns a schema into a validator: a function taking
+the decoded body and returning None, or the (status, error) to send back.
+All schemas are compiled when this module is imported.
+
+Errors use the same shape as the handlers' own:
+
+    401 {"error": "Require field missing", "field": name}
+    400 {"error": "Invalid field type, expected string", "field": name}
+    400 {"error": "Field too long, at most 64", "field": name}
+"""
+import os
+
+MAX_BODY_BYTES = int(os.environ.get("PARKING_MAX_BODY_BYTES", 64 << 10))
+MAX_BULK_BODY_BYTES = int(os.environ.get("PARKING_MAX_BULK_BODY_BYTES", 4 << 20))
+
+STRING = (str,)
+NUMBER = (int, float)
+TEXT_NUMBER = (int, float, str)
+LIST = (list,)
+OBJECT = (dict,)
+ANY = None
+
+TYPE_NAMES = {str: "string", int: "number", float: "number", list: "list", dict: "object", bool: "boolean"}
+
+
+def required(types, max_length=None):
+    return (types, True, max_length)
+
+
+def optional(types, max_length=None):
+    return (types, False, max_length)
+
+
+def compile_schema(schema):
+    checks = tuple(
+        (name, frozenset(types) if types else None, required, max_length,
+         "Invalid field type, expected " + " or ".join(dict.fromkeys(TYPE_NAMES[t] for t in types)) if types else None,
+         f"Field too long, at most {max_length}")
+        for name, (types, required, max_length) in schema.items()
+    )
+
+    def validate(data):
+        if type(data) is not dict:
+            return 400, {"error": "Invalid JSON body, expected an object", "field": None}
+        for name, types, required, max_length, type_error, length_error in checks:
+            value = data.get(name)
+            if value is None:
+                # a required field sent as null is as missing as one left out
+                if required:
+                    return 401, {"error": "Require field missing", "field": name}
+                continue
+            # bool is a subclass of int, so types are compared exactly
+            if types is not None and type(value) not in types:
+                return 400, {"error": type_error, "field": name}
+            if max_length is not None and len(value) > max_length:
+                return 400, {"error": length_error, "field": name}
+        return None
+
+    return validate
+
+
+SCHEMAS = {
+    "register": {
+        "username": required(STRING, 64),
+        "password": required(STRING, 128),
+        "name": optional(STRING, 128)
+    },
+    "login": {
+        "username": optional(STRING, 64),
+        "password": optional(STRING, 128)
+    },
+    "session": {
+        "licenseplate": required(STRING, 16),
+        "discount": optional(STRING, 64)
+    },
+    "parking_lot": {
+        "name": optional(STRING, 128),
+        "location": optional(STRING, 256),
+        "address": optional(STRING, 256),
+        "capacity": optional(TEXT_NUMBER),
+        "reserved": optional(NUMBER),
+        "tariff": optional(TEXT_NUMBER),
+        "daytariff": optional(TEXT_NUMBER),
+        "schedule": optional(LIST, 64)
+    },
+    "reservation": {
+        "licenseplate": required(STRING, 16),
+        "startdate": required(STRING, 32),
+        "enddate": required(STRING, 32),
+        "parkinglot": required(STRING, 16),
+        "user": optional(STRING, 64)
+    },
+    "vehicle": {
+        "name": required(STRING, 128),
+        "license_plate": required(STRING, 16)
+    },
+    "vehicle_update": {
+        "name": required(STRING, 128)
+    },
+    "entry": {
+        "parkinglot": required(STRING, 16)
+    },
+    "payment": {
+        "transaction": required(STRING, 64),
+        "amount": required(NUMBER)
+    },
+    "refund": {
+        "transaction": optional(STRING, 64),
+        "amount": required(NUMBER),
+        "coupled_to": optional(STRING, 64)
+    },
+    "payment_update": {
+        "t_data": required(OBJECT),
+        "validation": required(STRING, 64)
+    },
+    "payment_completion": {
+        "transaction": required(STRING, 64),
+        "t_data": required(OBJECT),
+        "validation": required(STRING, 64)
+    },
+    "profile": {
+        "name": optional(STRING, 128),
+        "password": optional(STRING, 128)
+    }
+}
+
+VALIDATORS = {name: compile_schema(schema) for name, schema in SCHEMAS.items()}
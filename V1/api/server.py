@@ -1,16 +1,196 @@
 import json
 import hashlib
-import uuid
-from datetime import datetime
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+from functools import wraps
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from storage_utils import load_json, save_data, save_user_data, load_parking_lot_data, save_parking_lot_data, save_reservation_data, load_reservation_data, load_payment_data, save_payment_data
-from session_manager import add_session, remove_session, get_session
+from storage_utils import write_lock, lock_data, read_snapshot, load_json, save_data, save_user_data, load_parking_lot_data, save_parking_lot_data, load_payment_data, save_payment_data
+from session_manager import create_token, remove_session, get_session
 import session_calculator as sc
+from tariffs import compile_tariff
+import payment_utils
+import billing
+import discounts
+import session_store
+import vehicle_index
+import reservation_store
+import session_index
+import payment_index
+import occupancy_events
+import snapshot
+import metrics
+import profiling
+import schemas
+import admission
+import scheduler
+import archive_job
+
+
+class CountingWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def writer(handler):
+    # requests that change data run one at a time; GET handlers read published snapshots without locking
+    @wraps(handler)
+    def locked(self):
+        with write_lock:
+            return handler(self)
+    return locked
+
 
 class RequestHandler(BaseHTTPRequestHandler):
+    # the dispatcher only waits for the first bytes of a request; a client that
+    # stalls after them must not hold a pool worker for longer than this per read
+    timeout = scheduler.HEADER_TIMEOUT
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        token = self.headers.get('Authorization')
+        # the token is checked once per request; handlers use self.session_user
+        self.session_user = get_session(token) if token else None
+        # rate limits follow a validated user, never a token the client can make up
+        client = ("user", self.session_user["username"]) if self.session_user else ("address", self.client_address[0])
+        refused = admission.admit(self.command, self.path, client)
+        if refused:
+            status, retry_after, error = refused
+            self.send_response(status)
+            self.send_header("Content-type", "application/json")
+            self.send_header("Retry-After", str(retry_after))
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": error, "field": None}).encode("utf-8"))
+            return False
+        requested = self.headers.get("X-Profile") and (self.session_user or {}).get('role') == 'ADMIN'
+        # event streams stay open indefinitely and are never profiled
+        self.profiler = None if urlparse(self.path).path.endswith("/events") else profiling.begin(self.path, requested)
+        return True
+
+    def read_body(self, schema=None, limit=schemas.MAX_BODY_BYTES):
+        """Return the decoded json body, checked against the named schema. When
+        the body is refused the error response has been sent and None is returned."""
+        length = self.headers.get("Content-Length", "")
+        if not length.isdigit():
+            status, error = 411, {"error": "Content-Length required", "field": None}
+        elif int(length) > limit:
+            status, error = 413, {"error": f"Request body too large, at most {limit} bytes", "field": None}
+        else:
+            try:
+                data = json.loads(self.rfile.read(int(length)))
+            except TimeoutError:
+                status, error = 408, {"error": "Request body timed out", "field": None}
+            except ValueError:
+                status, error = 400, {"error": "Invalid JSON body", "field": None}
+            else:
+                result = schemas.VALIDATORS[schema](data) if schema else None
+                if result is None:
+                    return data
+                status, error = result
+        self.close_connection = True
+        self.send_response(status)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(error).encode("utf-8"))
+        return None
+
+    def query_range(self):
+        query = parse_qs(urlparse(self.path).query)
+        since = datetime.strptime(query["from"][0], "%Y-%m-%d") if "from" in query else None
+        until = datetime.strptime(query["to"][0], "%Y-%m-%d") + timedelta(days=1, seconds=-1) if "to" in query else None
+        return since, until
+
+    def query_paging(self):
+        query = parse_qs(urlparse(self.path).query)
+        offset = int(query.get("offset", ["0"])[0])
+        limit = min(int(query.get("limit", ["50"])[0]), 500)
+        if offset < 0 or limit < 0:
+            raise ValueError("negative offset or limit")
+        return offset, limit
+
+    def handle_one_request(self):
+        start = time.perf_counter()
+        self.command = None
+        self.status = None
+        self.profiler = None
+        self.wfile.written = 0
+        try:
+            super().handle_one_request()
+        finally:
+            # a handler that raised must still stop its profiler and free the profiling slot
+            if self.profiler:
+                profiling.end(self.profiler, self.command, self.path, time.perf_counter() - start)
+        if self.command and self.status:
+            length = self.headers.get("Content-Length", "0") if getattr(self, "headers", None) else "0"
+            metrics.observe_request(self.command, self.path, self.status, time.perf_counter() - start,
+                                    int(length) if length.isdigit() else 0, self.wfile.written)
+
     def do_POST(self):
+        # archiving holds write_lock only for short steps, so it is not a writer as a whole
+        if urlparse(self.path).path == "/admin/archive":
+            return self.archive()
+        return self.write_POST()
+
+    def archive(self):
+        token = self.headers.get('Authorization')
+        if not token or not self.session_user:
+            self.send_response(401)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"Unauthorized: Invalid or missing session token")
+            return
+        if not 'ADMIN' == self.session_user.get('role'):
+            self.send_response(403)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"Access denied")
+            return
+        try:
+            keep_days = int(parse_qs(urlparse(self.path).query).get("keep_days", ["30"])[0])
+        except ValueError:
+            keep_days = -1
+        if keep_days < 0:
+            self.send_response(400)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Invalid keep_days, expected a non-negative integer", "field": "keep_days"}).encode("utf-8"))
+            return
+        # archive_job takes write_lock itself, per lot and for the payments, only
+        # to swap the live files; the files it rewrites go through save_data and
+        # the indexes rebuild on their changed mtimes
+        result = archive_job.run(keep_days)
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(result).encode("utf-8"))
+        return
+
+    @writer
+    def write_POST(self):
         if self.path == "/register":
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+            data = self.read_body("register")
+            if data is None:
+                return
             username = data.get("username")
             password = data.get("password")
             name = data.get("name")
@@ -36,7 +216,9 @@ class RequestHandler(BaseHTTPRequestHandler):
 
 
         elif self.path == "/login":
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+            data = self.read_body("login")
+            if data is None:
+                return
             username = data.get("username")
             password = data.get("password")
             if not username or not password:
@@ -50,8 +232,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             for user in users:
                 if user.get("username") == username:
                     if user.get("password") == hashed_password:
-                        token = str(uuid.uuid4())
-                        add_session(token, user)
+                        token = create_token(user)
                         self.send_response(200)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
@@ -73,24 +254,20 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path.startswith("/parking-lots"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
+            session_user = self.session_user
             if 'sessions' in self.path:
                 lid = self.path.split("/")[2]
-                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
-                sessions = load_json(f'data/pdata/p{lid}-sessions.json')
+                data = self.read_body("session")
+                if data is None:
+                    return
+                sessions = session_store.load_sessions(lid)
                 if self.path.endswith('start'):
-                    if 'licenseplate' not in data:
-                        self.send_response(401)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Require field missing", "field": 'licenseplate'}).encode("utf-8"))
-                        return
                     filtered = {key: value for key, value in sessions.items() if value.get("licenseplate") == data['licenseplate'] and not value.get('stopped')}
                     if len(filtered) > 0:
                         self.send_response(401)
@@ -98,26 +275,31 @@ class RequestHandler(BaseHTTPRequestHandler):
                         self.end_headers()
                         self.wfile.write(b'Cannot start a session when another sessions for this licesenplate is already started.')
                         return 
+                    if data.get('discount') and data['discount'] not in discounts.current().codes:
+                        self.send_response(400)
+                        self.send_header("Content-type", "application/json")
+                        self.end_headers()
+                        self.wfile.write(json.dumps({"error": "Unknown discount code", "field": 'discount'}).encode("utf-8"))
+                        return
                     session = {
                         "licenseplate": data['licenseplate'],
                         "started": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
                         "stopped": None,
                         "user": session_user["username"]
                     }
-                    sessions[str(len(sessions) + 1)] = session
-                    save_data(f'data/pdata/p{lid}-sessions.json', sessions)
+                    if data.get('discount'):
+                        session["discount"] = data['discount']
+                    sid = session_store.next_session_id(lid, sessions)
+                    sessions[sid] = session
+                    session_store.save_sessions(lid, sessions, defer=True)
+                    session_index.record(lid, sid, session)
+                    occupancy_events.sessions_changed(lid, sessions)
                     self.send_response(200)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
                     self.wfile.write(f"Session started for: {data['licenseplate']}".encode('utf-8'))
 
                 elif self.path.endswith('stop'):
-                    if 'licenseplate' not in data:
-                        self.send_response(401)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Require field missing", "field": 'licenseplate'}).encode("utf-8"))
-                        return
                     filtered = {key: value for key, value in sessions.items() if value.get("licenseplate") == data['licenseplate'] and not value.get('stopped')}
                     if len(filtered) == 0:
                         self.send_response(401)
@@ -127,7 +309,9 @@ class RequestHandler(BaseHTTPRequestHandler):
                         return
                     sid = next(iter(filtered))
                     sessions[sid]["stopped"] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-                    save_data(f'data/pdata/p{lid}-sessions.json', sessions)
+                    session_store.save_sessions(lid, sessions)
+                    session_index.record(lid, sid, sessions[sid])
+                    occupancy_events.sessions_changed(lid, sessions)
                     self.send_response(200)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
@@ -140,7 +324,18 @@ class RequestHandler(BaseHTTPRequestHandler):
                     self.end_headers()
                     self.wfile.write(b"Access denied")
                     return
-                data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+                data = self.read_body("parking_lot")
+                if data is None:
+                    return
+                if "schedule" in data:
+                    try:
+                        compile_tariff(data)
+                    except (TypeError, ValueError) as e:
+                        self.send_response(400)
+                        self.send_header("Content-type", "application/json")
+                        self.end_headers()
+                        self.wfile.write(json.dumps({"error": str(e), "field": "schedule"}).encode("utf-8"))
+                        return
                 parking_lots = load_parking_lot_data()
                 new_lid = str(len(parking_lots) + 1)
                 parking_lots[new_lid] = data
@@ -153,24 +348,19 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path == "/reservations":
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
-            reservations = load_reservation_data()
+            session_user = self.session_user
+            data = self.read_body("reservation")
+            if data is None:
+                return
+            reservations = reservation_store.load_reservations()
             parking_lots = load_parking_lot_data()
-            rid = str(len(reservations) + 1)
-            for field in ["licenseplate", "startdate", "enddate", "parkinglot"]:
-                if not field in data:
-                    self.send_response(401)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                    return
+            rid = reservation_store.next_reservation_id(reservations)
             if data.get("parkinglot", -1) not in parking_lots:
                 self.send_response(404)
                 self.send_header("Content-type", "application/json")
@@ -186,37 +376,34 @@ class RequestHandler(BaseHTTPRequestHandler):
                     return
             else:
                 data["user"] = session_user["username"]
-                data["id"] = rid
-                reservations.append(data)
-                parking_lots[data["parkinglot"]]["reserved"] += 1
-                save_reservation_data(reservations)
-                save_parking_lot_data(parking_lots)
-                self.send_response(201)
-                self.send_header("Content-type", "application/json")
-                self.end_headers()
-                self.wfile.write(json.dumps({"status": "Success", "reservation": data}).encode("utf-8"))
-                return
+            data["id"] = rid
+            reservations[rid] = data
+            parking_lots[data["parkinglot"]]["reserved"] = parking_lots[data["parkinglot"]].get("reserved", 0) + 1
+            reservation_store.save_reservations(reservations)
+            save_parking_lot_data(parking_lots)
+            reservation_store.upsert(rid, data)
+            occupancy_events.publish(data["parkinglot"], parking_lots[data["parkinglot"]])
+            self.send_response(201)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "Success", "reservation": data}).encode("utf-8"))
+            return
         
         elif self.path == "/vehicles":
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+            session_user = self.session_user
+            data = self.read_body("vehicle")
+            if data is None:
+                return
             vehicles = load_json("data/vehicles.json")
             user = session_user["username"]
             uvehicles = vehicles.get(session_user["username"],{})
-            for field in ["name", "license_plate"]:
-                if not field in data:
-                    self.send_response(401)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                    return
             lid = data["license_plate"].replace("-", "")    
             if lid in uvehicles:
                 self.send_response(401)
@@ -226,13 +413,14 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
             if not uvehicles:
                 vehicles[session_user["username"]] = {}
-                vehicles[session_user["username"]][lid] = {
+            vehicles[session_user["username"]][lid] = {
                 "licenseplate": data["license_plate"],
                 "name": data["name"],
                 "created_at": datetime.now(),
                 "updated_at": datetime.now()
             }
             save_data("data/vehicles.json", vehicles)
+            vehicle_index.upsert(session_user["username"], lid, vehicles[session_user["username"]][lid])
             self.send_response(201)
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -242,25 +430,19 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path.startswith("/vehicles/"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
-            vehicles = load_json("data/vehicles.json")
-            uvehicles = vehicles.get(session_user["username"], {})
-            for field in ["parkinglot"]:
-                if not field in data:
-                    self.send_response(401)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                    return
+            session_user = self.session_user
+            data = self.read_body("entry")
+            if data is None:
+                return
             lid = self.path.replace("/vehicles/", "").replace("/entry", "")
-            if lid not in uvehicles:
+            vehicle = vehicle_index.owner_of(lid, session_user["username"])
+            if vehicle is None:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
@@ -269,21 +451,55 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
-            self.wfile.write(json.dumps({"status": "Accepted", "vehicle": vehicles[session_user["username"]][lid]}).encode("utf-8"))
+            self.wfile.write(json.dumps({"status": "Accepted", "vehicle": vehicle}, default=str).encode("utf-8"))
             return
         
 
+        elif self.path == "/payments/bulk":
+            token = self.headers.get('Authorization')
+            if not token or not self.session_user:
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Unauthorized: Invalid or missing session token")
+                return
+            session_user = self.session_user
+            data = self.read_body(limit=schemas.MAX_BULK_BODY_BYTES)
+            if data is None:
+                return
+            items = data.get("payments") if isinstance(data, dict) else data
+            if not isinstance(items, list):
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Require field missing", "field": "payments"}).encode("utf-8"))
+                return
+            created, results = payment_utils.create_payments(items, session_user["username"])
+            if created:
+                payments = load_payment_data()
+                payments.extend(created)
+                save_payment_data(payments)
+                payment_index.appended(payments)
+            self.send_response(201)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "Success", "created": len(created), "failed": len(results) - len(created), "results": results}).encode("utf-8"))
+            return
+
+
         elif self.path.startswith("/payments"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
             payments = load_payment_data()
-            session_user = get_session(token)
-            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+            session_user = self.session_user
+            data = self.read_body("refund" if self.path.endswith("/refund") else "payment")
+            if data is None:
+                return
             if self.path.endswith("/refund"):
                 if not 'ADMIN' == session_user.get('role'):
                     self.send_response(403)
@@ -291,13 +507,6 @@ class RequestHandler(BaseHTTPRequestHandler):
                     self.end_headers()
                     self.wfile.write(b"Access denied")
                     return 
-                for field in ["amount"]:
-                    if not field in data:
-                        self.send_response(401)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                        return
                 payment = {
                     "transaction": data["transaction"] if data.get("transaction") else sc.generate_payment_hash(session_user["username"], str(datetime.now())),
                     "amount": -abs(data.get("amount", 0)),
@@ -308,13 +517,6 @@ class RequestHandler(BaseHTTPRequestHandler):
                     "hash": sc.generate_transaction_validation_hash()
                 }
             else:
-                for field in ["transaction", "amount"]:
-                    if not field in data:
-                        self.send_response(401)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                        return
                 payment = {
                     "transaction": data.get("transaction"),
                     "amount": data.get("amount", 0),
@@ -325,12 +527,14 @@ class RequestHandler(BaseHTTPRequestHandler):
                 }
             payments.append(payment)
             save_payment_data(payments)
+            payment_index.appended(payments)
             self.send_response(201)
             self.send_header("Content-type", "application/json")
             self.end_headers()
             self.wfile.write(json.dumps({"status": "Success", "payment": payment}).encode("utf-8"))
             return
 
+    @writer
     def do_PUT(self):
         if self.path.startswith("/parking-lots/"):
             lid = self.path.split("/")[2]
@@ -338,22 +542,34 @@ class RequestHandler(BaseHTTPRequestHandler):
             if lid:
                 if lid in parking_lots:
                     token = self.headers.get('Authorization')
-                    if not token or not get_session(token):
+                    if not token or not self.session_user:
                         self.send_response(401)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Unauthorized: Invalid or missing session token")
                         return
-                    session_user = get_session(token)
+                    session_user = self.session_user
                     if not 'ADMIN' == session_user.get('role'):
                         self.send_response(403)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Access denied")
                         return
-                    data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+                    data = self.read_body("parking_lot")
+                    if data is None:
+                        return
+                    if "schedule" in data:
+                        try:
+                            compile_tariff(data)
+                        except (TypeError, ValueError) as e:
+                            self.send_response(400)
+                            self.send_header("Content-type", "application/json")
+                            self.end_headers()
+                            self.wfile.write(json.dumps({"error": str(e), "field": "schedule"}).encode("utf-8"))
+                            return
                     parking_lots[lid] = data
                     save_parking_lot_data(parking_lots)
+                    occupancy_events.publish(lid, data)
                     self.send_response(200)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
@@ -368,18 +584,27 @@ class RequestHandler(BaseHTTPRequestHandler):
                 
         elif self.path == "/profile":
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
-            data["username"] = session_user["username"]
-            if data["password"]:
-                data["password"] = hashlib.md5(data["password"].encode()).hexdigest()
-            save_user_data(data)
+            session_user = self.session_user
+            data = self.read_body("profile")
+            if data is None:
+                return
+            # only these fields are the user's to change; role and username are not
+            changes = {}
+            if data.get("name") is not None:
+                changes["name"] = data["name"]
+            if data.get("password"):
+                changes["password"] = hashlib.md5(data["password"].encode()).hexdigest()
+            users = load_json('data/users.json')
+            for user in users:
+                if user.get("username") == session_user["username"]:
+                    user.update(changes)
+            save_user_data(users)
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -387,26 +612,21 @@ class RequestHandler(BaseHTTPRequestHandler):
 
 
         elif self.path.startswith("/reservations/"):
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
-            reservations = load_reservation_data()
+            data = self.read_body("reservation")
+            if data is None:
+                return
+            reservations = reservation_store.load_reservations()
             rid = self.path.replace("/reservations/", "")
             if rid:
                 if rid in reservations:
                     token = self.headers.get('Authorization')
-                    if not token or not get_session(token):
+                    if not token or not self.session_user:
                         self.send_response(401)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Unauthorized: Invalid or missing session token")
                         return
-                    session_user = get_session(token)
-                    for field in ["licenseplate", "startdate", "enddate", "parkinglot"]:
-                        if not field in data:
-                            self.send_response(401)
-                            self.send_header("Content-type", "application/json")
-                            self.end_headers()
-                            self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                            return
+                    session_user = self.session_user
                     if 'ADMIN' == session_user.get('role'):
                         if not "user" in data:
                             self.send_response(401)
@@ -416,8 +636,10 @@ class RequestHandler(BaseHTTPRequestHandler):
                             return
                     else:
                         data["user"] = session_user["username"]
+                    data["id"] = rid
                     reservations[rid] = data
-                    save_reservation_data(reservations)
+                    reservation_store.save_reservations(reservations)
+                    reservation_store.upsert(rid, data)
                     self.send_response(200)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
@@ -433,23 +655,18 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path.startswith("/vehicles/"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
+            session_user = self.session_user
+            data = self.read_body("vehicle_update")
+            if data is None:
+                return
             vehicles = load_json("data/vehicles.json")
             uvehicles = vehicles.get(session_user["username"], {})
-            for field in ["name"]:
-                if not field in data:
-                    self.send_response(401)
-                    self.send_header("Content-type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                    return
             lid = self.path.replace("/vehicles/", "")
             if not uvehicles:
                 vehicles[session_user["username"]] = {}
@@ -462,16 +679,46 @@ class RequestHandler(BaseHTTPRequestHandler):
                 }
             vehicles[session_user["username"]][lid]["name"] = data["name"]
             vehicles[session_user["username"]][lid]["updated_at"] = datetime.now()
-            save_data("data/vehicles.json", vehicles)
+            save_data("data/vehicles.json", vehicles, defer=True)
+            vehicle_index.upsert(session_user["username"], lid, vehicles[session_user["username"]][lid])
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
             self.wfile.write(json.dumps({"status": "Success", "vehicle": vehicles[session_user["username"]][lid]}, default=str).encode("utf-8"))
             return
         
+        elif self.path == "/payments/bulk":
+            token = self.headers.get('Authorization')
+            if not token or not self.session_user:
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Unauthorized: Invalid or missing session token")
+                return
+            data = self.read_body(limit=schemas.MAX_BULK_BODY_BYTES)
+            if data is None:
+                return
+            items = data.get("payments") if isinstance(data, dict) else data
+            if not isinstance(items, list):
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Require field missing", "field": "payments"}).encode("utf-8"))
+                return
+            payments = load_payment_data()
+            completed, results = payment_utils.complete_payments(payments, items)
+            if completed:
+                save_payment_data(payments)
+                payment_index.updated()
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "Success", "completed": completed, "failed": len(results) - completed, "results": results}, default=str).encode("utf-8"))
+            return
+
         elif self.path.startswith("/payments/"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
@@ -479,17 +726,12 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
             pid = self.path.replace("/payments/", "")
             payments = load_payment_data()
-            session_user = get_session(token)
-            data  = json.loads(self.rfile.read(int(self.headers.get("Content-Length", -1))))
-            payment = next(p for p in payments if p["transaction"] == pid)
+            session_user = self.session_user
+            data = self.read_body("payment_update")
+            if data is None:
+                return
+            payment = next((p for p in payments if p["transaction"] == pid), None)
             if payment:
-                for field in ["t_data", "validation"]:
-                    if not field in data:
-                        self.send_response(401)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": "Require field missing", "field": field}).encode("utf-8"))
-                        return
                 if payment["hash"] != data.get("validation"):
                     self.send_response(401)
                     self.send_header("Content-type", "application/json")
@@ -499,6 +741,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 payment["completed"] = datetime.now().strftime("%d-%m-%Y %H:%I:%s")
                 payment["t_data"] = data.get("t_data", {})
                 save_payment_data(payments)
+                payment_index.updated()
                 self.send_response(200)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
@@ -512,6 +755,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
 
 
+    @writer
     def do_DELETE(self):
         if self.path.startswith("/parking-lots/"):
             lid = self.path.split("/")[2]
@@ -519,13 +763,13 @@ class RequestHandler(BaseHTTPRequestHandler):
             if lid:
                 if lid in parking_lots:
                     token = self.headers.get('Authorization')
-                    if not token or not get_session(token):
+                    if not token or not self.session_user:
                         self.send_response(401)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Unauthorized: Invalid or missing session token")
                         return
-                    session_user = get_session(token)
+                    session_user = self.session_user
                     if not 'ADMIN' == session_user.get('role'):
                         self.send_response(403)
                         self.send_header("Content-type", "application/json")
@@ -533,11 +777,18 @@ class RequestHandler(BaseHTTPRequestHandler):
                         self.wfile.write(b"Access denied")
                         return
                     if 'sessions' in self.path:
-                        sessions = load_json(f'data/pdata/p{lid}-sessions.json')
+                        sessions = session_store.load_sessions(lid)
                         sid = self.path.split("/")[-1]
-                        if sid.isnumeric():
+                        if sid.isnumeric() and sid not in sessions:
+                            self.send_response(404)
+                            self.send_header("Content-type", "application/json")
+                            self.end_headers()
+                            self.wfile.write(b"Session not found")
+                        elif sid.isnumeric():
                             del sessions[sid]
-                            save_data(f'data/pdata/p{lid}-sessions.json', sessions)
+                            session_store.save_sessions(lid, sessions)
+                            session_index.remove(lid, sid)
+                            occupancy_events.sessions_changed(lid, sessions)
                             self.send_response(200)
                             self.send_header("Content-type", "application/json")
                             self.end_headers()
@@ -563,7 +814,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 
         
         elif self.path.startswith("/reservations/"):
-            reservations = load_reservation_data()          # verwacht dict: { "1": {...}, ... }
+            reservations = reservation_store.load_reservations()
             parking_lots = load_parking_lot_data()
 
             # id uit URL halen (zonder trailing slash of querystring)
@@ -580,7 +831,7 @@ class RequestHandler(BaseHTTPRequestHandler):
 
             # Auth check
             token = self.headers.get('Authorization')
-            session_user = get_session(token) if token else None
+            session_user = self.session_user
             if not session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
@@ -614,8 +865,11 @@ class RequestHandler(BaseHTTPRequestHandler):
 
             # Verwijder en sla op
             del reservations[rid]
-            save_reservation_data(reservations)
+            reservation_store.save_reservations(reservations)
             save_parking_lot_data(parking_lots)
+            reservation_store.remove(rid)
+            if pid is not None and pid in parking_lots:
+                occupancy_events.publish(pid, parking_lots[pid])
 
             self.send_response(200)
             self.send_header("Content-type", "application/json")
@@ -628,13 +882,13 @@ class RequestHandler(BaseHTTPRequestHandler):
             lid = self.path.replace("/vehicles/", "")
             if lid:
                 token = self.headers.get('Authorization')
-                if not token or not get_session(token):
+                if not token or not self.session_user:
                     self.send_response(401)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
                     self.wfile.write(b"Unauthorized: Invalid or missing session token")
                     return
-                session_user = get_session(token)
+                session_user = self.session_user
                 vehicles = load_json("data/vehicles.json")
                 uvehicles = vehicles.get(session_user["username"], {})
                 if lid not in uvehicles:
@@ -645,6 +899,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                     return
                 del vehicles[session_user["username"]][lid]
                 save_data("data/vehicles.json", vehicles)
+                vehicle_index.remove(session_user["username"], lid)
                 self.send_response(200)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
@@ -653,15 +908,111 @@ class RequestHandler(BaseHTTPRequestHandler):
 
 
     def do_GET(self):
-        if self.path == "/profile":
+        if self.path == "/metrics":
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-type", "text/plain; version=0.0.4")
+            self.end_headers()
+            self.wfile.write(body)
+
+
+        elif self.path == "/admin/profiles":
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
+            session_user = self.session_user
+            if not 'ADMIN' == session_user.get('role'):
+                self.send_response(403)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Access denied")
+                return
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(profiling.list_profiles()).encode("utf-8"))
+
+
+        elif urlparse(self.path).path == "/admin/billing/export":
+            token = self.headers.get('Authorization')
+            if not token or not self.session_user:
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Unauthorized: Invalid or missing session token")
+                return
+            session_user = self.session_user
+            if not 'ADMIN' == session_user.get('role'):
+                self.send_response(403)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Access denied")
+                return
+            format = parse_qs(urlparse(self.path).query).get("format", ["csv"])[0]
+            if format not in ("csv", "jsonl"):
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid format, expected csv or jsonl", "field": "format"}).encode("utf-8"))
+                return
+            try:
+                since, until = self.query_range()
+            except ValueError:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid date, expected YYYY-MM-DD", "field": "from/to"}).encode("utf-8"))
+                return
+            self.send_response(200)
+            self.send_header("Content-type", "text/csv" if format == "csv" else "application/x-ndjson")
+            self.send_header("Content-Disposition", f'attachment; filename="billing.{format}"')
+            self.end_headers()
+            for chunk in billing.export_chunks(billing.export_rows(since, until), format):
+                self.wfile.write(chunk)
+
+
+        elif self.path.startswith("/admin/vehicles/"):
+            token = self.headers.get('Authorization')
+            if not token or not self.session_user:
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Unauthorized: Invalid or missing session token")
+                return
+            session_user = self.session_user
+            if not 'ADMIN' == session_user.get('role'):
+                self.send_response(403)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Access denied")
+                return
+            plate = self.path.replace("/admin/vehicles/", "")
+            owners = vehicle_index.lookup(plate)
+            if not owners:
+                self.send_response(404)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Vehicle not found")
+                return
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"licenseplate": plate, "owners": owners}, default=str).encode("utf-8"))
+
+
+        elif self.path == "/profile":
+            token = self.headers.get('Authorization')
+            if not token or not self.session_user:
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Unauthorized: Invalid or missing session token")
+                return
+            session_user = self.session_user
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -670,7 +1021,7 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path == "/logout":
             token = self.headers.get('Authorization')
-            if token and get_session(token):
+            if token and self.session_user:
                 remove_session(token)
                 self.send_response(200)
                 self.send_header("Content-type", "application/json")
@@ -685,7 +1036,7 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path.startswith("/parking-lots/"):
             lid = self.path.split("/")[2]
-            parking_lots = load_parking_lot_data()
+            parking_lots = read_snapshot('data/parking-lots.json')
             token = self.headers.get('Authorization')
             if lid:
                 if lid not in parking_lots:
@@ -694,29 +1045,56 @@ class RequestHandler(BaseHTTPRequestHandler):
                     self.end_headers()
                     self.wfile.write(b"Parking lot not found")
                     return
+                if urlparse(self.path).path.endswith('/events'):
+                    self.send_response(200)
+                    self.send_header("Content-type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    self.close_connection = True
+                    self.connection.settimeout(occupancy_events.WRITE_TIMEOUT)
+                    try:
+                        for payload in occupancy_events.events(lid, parking_lots[lid], lambda: session_store.count_open(lid)):
+                            self.wfile.write(payload or b": keep-alive\n\n")
+                    except OSError:
+                        pass
+                    return
                 if 'sessions' in self.path:
-                    if not token or not get_session(token):
+                    if not token or not self.session_user:
                         self.send_response(401)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Unauthorized: Invalid or missing session token")
                         return
-                    sessions = load_json(f'data/pdata/p{lid}-sessions.json')
-                    rsessions = []
-                    if self.path.endswith('/sessions'):
-                        if "ADMIN" == session_user.get('role'):
-                            rsessions = sessions
-                        else:
-                            for session in sessions:
-                                if session['user'] == session_user['username']:
-                                    rsessions.append(session)
+                    session_user = self.session_user
+                    path = urlparse(self.path).path
+                    if path.endswith('/sessions'):
+                        try:
+                            since, until = self.query_range()
+                        except ValueError:
+                            self.send_response(400)
+                            self.send_header("Content-type", "application/json")
+                            self.end_headers()
+                            self.wfile.write(json.dumps({"error": "Invalid date, expected YYYY-MM-DD", "field": "from/to"}).encode("utf-8"))
+                            return
+                        rsessions = {}
+                        user = None if "ADMIN" == session_user.get('role') else session_user['username']
+                        for sid, session in session_store.iter_sessions(lid, since, until, user=user):
+                            rsessions[sid] = session
                         self.send_response(200)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
-                        self.wfile.write(json.dumps(rsessions).encode('utf-8'))  
+                        self.wfile.write(json.dumps(rsessions).encode('utf-8'))
+                        return
                     else:
-                        sid = self.path.split("/")[-1]
-                        if not "ADMIN" == session_user.get('role') and not session_user["username"] == sessions[sid].get("user"):
+                        sid = path.split("/")[-1]
+                        session = session_store.find_session(lid, sid)
+                        if not session:
+                            self.send_response(404)
+                            self.send_header("Content-type", "application/json")
+                            self.end_headers()
+                            self.wfile.write(b"Session not found")
+                            return
+                        if not "ADMIN" == session_user.get('role') and not session_user["username"] == session.get("user"):
                             self.send_response(403)
                             self.send_header("Content-type", "application/json")
                             self.end_headers()
@@ -725,7 +1103,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                         self.send_response(200)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
-                        self.wfile.write(json.dumps(sessions[sid]).encode('utf-8'))
+                        self.wfile.write(json.dumps(session).encode('utf-8'))
                         return
                 else:
                     self.send_response(200)
@@ -739,30 +1117,52 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(parking_lots).encode('utf-8'))
 
 
+        elif urlparse(self.path).path == "/reservations":
+            token = self.headers.get('Authorization')
+            if not token or not self.session_user:
+                self.send_response(401)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"Unauthorized: Invalid or missing session token")
+                return
+            session_user = self.session_user
+            query = parse_qs(urlparse(self.path).query)
+            if "ADMIN" == session_user.get('role') and "lot" in query:
+                reservations = reservation_store.for_lot(query["lot"][0])
+            elif "ADMIN" == session_user.get('role') and "user" in query:
+                reservations = reservation_store.for_user(query["user"][0])
+            else:
+                reservations = reservation_store.for_user(session_user["username"])
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(reservations).encode("utf-8"))
+            return
+
+
         elif self.path.startswith("/reservations/"):
-            reservations = load_reservation_data()
             rid = self.path.replace("/reservations/", "")
             if rid:
-                if rid in reservations:
+                reservation = reservation_store.get(rid)
+                if reservation:
                     token = self.headers.get('Authorization')
-                    if not token or not get_session(token):
+                    if not token or not self.session_user:
                         self.send_response(401)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Unauthorized: Invalid or missing session token")
                         return
-                    session_user = get_session(token)
-                    if not "ADMIN" == session_user.get('role') and not session_user["username"] == reservations[rid].get("user"):
+                    session_user = self.session_user
+                    if not "ADMIN" == session_user.get('role') and not session_user["username"] == reservation.get("user"):
                         self.send_response(403)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
                         self.wfile.write(b"Access denied")
                         return
-                    save_reservation_data(reservations)
                     self.send_response(200)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
-                    self.wfile.write(json.dumps(reservations[rid]).encode("utf-8"))
+                    self.wfile.write(json.dumps(reservation).encode("utf-8"))
                     return
                 else:
                     self.send_response(404)
@@ -772,21 +1172,27 @@ class RequestHandler(BaseHTTPRequestHandler):
                     return
                 
         
-        elif self.path == "/payments":
+        elif urlparse(self.path).path == "/payments":
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            payments = []
-            session_user = get_session(token)
-            for payment in load_payment_data():
-                if payment["username"] == session_user["username"]:
-                    payments.append(payment)
+            session_user = self.session_user
+            try:
+                offset, limit = self.query_paging()
+            except ValueError:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid paging, expected non-negative integers", "field": "offset/limit"}).encode("utf-8"))
+                return
+            total, payments = payment_index.for_user(session_user["username"], offset, limit)
             self.send_response(200)
             self.send_header("Content-type", "application/json")
+            self.send_header("X-Total-Count", str(total))
             self.end_headers()
             self.wfile.write(json.dumps(payments).encode("utf-8"))
             return
@@ -794,55 +1200,55 @@ class RequestHandler(BaseHTTPRequestHandler):
     
         elif self.path.startswith("/payments/"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            payments = []
-            session_user = get_session(token)
-            user = self.path.replace("/payments/", "")
+            session_user = self.session_user
+            user = urlparse(self.path).path.replace("/payments/", "")
             if not "ADMIN" == session_user.get('role'):
                 self.send_response(403)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Access denied")
                 return
-            for payment in load_payment_data():
-                if payment["username"] == session_user["username"]:
-                    payments.append(payment)
+            try:
+                offset, limit = self.query_paging()
+            except ValueError:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid paging, expected non-negative integers", "field": "offset/limit"}).encode("utf-8"))
+                return
+            total, payments = payment_index.for_user(user, offset, limit)
             self.send_response(200)
             self.send_header("Content-type", "application/json")
+            self.send_header("X-Total-Count", str(total))
             self.end_headers()
             self.wfile.write(json.dumps(payments).encode("utf-8"))
             return
 
 
-        elif self.path == "/billing":
+        elif urlparse(self.path).path == "/billing":
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            data = []
-            session_user = get_session(token)
-            for pid, parkinglot in load_parking_lot_data().items():
-                for sid, session in load_json(f'data/pdata/p{pid}-sessions.json').items():
-                    if session["user"] == session_user["username"]:
-                        amount, hours, days = sc.calculate_price(parkinglot, sid, session)
-                        transaction = sc.generate_payment_hash(sid, session)
-                        payed = sc.check_payment_amount(transaction)
-                        data.append({
-                            "session": {k: v for k, v in session.items() if k in ["licenseplate", "started", "stopped"]} | {"hours": hours, "days": days},
-                            "parking": {k: v for k, v in parkinglot.items() if k in ["name", "location", "tariff", "daytariff"]},
-                            "amount": amount,
-                            "thash": transaction,
-                            "payed": payed,
-                            "balance": amount - payed
-                        })
+            try:
+                since, until = self.query_range()
+            except ValueError:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid date, expected YYYY-MM-DD", "field": "from/to"}).encode("utf-8"))
+                return
+            session_user = self.session_user
+            data = billing.user_billing(session_user["username"], since, until)
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -852,35 +1258,29 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path.startswith("/billing/"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            data = []
-            session_user = get_session(token)
-            user = self.path.replace("/billing/", "")
+            try:
+                since, until = self.query_range()
+            except ValueError:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Invalid date, expected YYYY-MM-DD", "field": "from/to"}).encode("utf-8"))
+                return
+            session_user = self.session_user
+            user = urlparse(self.path).path.replace("/billing/", "")
             if not "ADMIN" == session_user.get('role'):
                 self.send_response(403)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Access denied")
                 return
-            for pid, parkinglot in load_parking_lot_data().items():
-                for sid, session in load_json(f'data/pdata/p{pid}-sessions.json').items():
-                    if session["user"] == user:
-                        amount, hours, days = sc.calculate_price(parkinglot, sid, session)
-                        transaction = sc.generate_payment_hash(sid, session)
-                        payed = sc.check_payment_amount(transaction)
-                        data.append({
-                            "session": {k: v for k, v in session.items() if k in ["licenseplate", "started", "stopped"]} | {"hours": hours, "days": days},
-                            "parking": {k: v for k, v in parkinglot.items() if k in ["name", "location", "tariff", "daytariff"]},
-                            "amount": amount,
-                            "thash": transaction,
-                            "payed": payed,
-                            "balance": amount - payed
-                        })
+            data = billing.user_billing(user, since, until)
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -890,16 +1290,16 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         elif self.path.startswith("/vehicles"):
             token = self.headers.get('Authorization')
-            if not token or not get_session(token):
+            if not token or not self.session_user:
                 self.send_response(401)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
                 self.wfile.write(b"Unauthorized: Invalid or missing session token")
                 return
-            session_user = get_session(token)
+            session_user = self.session_user
             if self.path.endswith("/reservations"):
                 vid = self.path.split("/")[2]
-                vehicles = load_json("data/vehicles.json")
+                vehicles = read_snapshot("data/vehicles.json")
                 uvehicles = vehicles.get(session_user["username"], {}) 
                 if vid not in uvehicles:
                     self.send_response(404)
@@ -907,14 +1307,15 @@ class RequestHandler(BaseHTTPRequestHandler):
                     self.end_headers()
                     self.wfile.write(b"Not found!")
                     return
+                reservations = reservation_store.for_plate(uvehicles[vid].get("licenseplate") or vid, session_user["username"])
                 self.send_response(200)
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
-                self.wfile.write(json.dumps([]).encode("utf-8"))
+                self.wfile.write(json.dumps(reservations).encode("utf-8"))
                 return
-            elif self.path.endswith("/history"):
-                vid = self.path.split("/")[2]
-                vehicles = load_json("data/vehicles.json")
+            elif urlparse(self.path).path.endswith("/history"):
+                vid = urlparse(self.path).path.split("/")[2]
+                vehicles = read_snapshot("data/vehicles.json")
                 uvehicles = vehicles.get(session_user["username"], {})
                 if vid not in uvehicles:
                     self.send_response(404)
@@ -922,14 +1323,24 @@ class RequestHandler(BaseHTTPRequestHandler):
                     self.end_headers()
                     self.wfile.write(b"Not found!")
                     return
+                try:
+                    offset, limit = self.query_paging()
+                except ValueError:
+                    self.send_response(400)
+                    self.send_header("Content-type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": "Invalid paging, expected non-negative integers", "field": "offset/limit"}).encode("utf-8"))
+                    return
+                total, history = session_index.history(uvehicles[vid].get("licenseplate") or vid, session_user["username"], offset, limit)
                 self.send_response(200)
                 self.send_header("Content-type", "application/json")
+                self.send_header("X-Total-Count", str(total))
                 self.end_headers()
-                self.wfile.write(json.dumps([]).encode("utf-8"))
+                self.wfile.write(json.dumps(history).encode("utf-8"))
                 return
             else:
-                vehicles = load_json("data/vehicles.json")
-                users = load_json('data/users.json')
+                vehicles = read_snapshot("data/vehicles.json")
+                users = read_snapshot('data/users.json')
                 user = session_user["username"]
                 if "ADMIN" == session_user.get("role") and self.path != "/vehicles":
                     user = self.path.replace("/vehicles/", "")
@@ -946,15 +1357,28 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
             
 
-server = HTTPServer(('localhost', 5000), RequestHandler)
-print("Server running on http://localhost:5000")
-server.serve_forever()
+class ParkingHTTPServer(scheduler.SchedulingMixIn, HTTPServer):
+    pass
+
 
 def start_server(host="127.0.0.1", port=5000):
-    httpd = HTTPServer((host, port), RequestHandler)
+    httpd = ParkingHTTPServer((host, port), RequestHandler)
     print(f"Server running on http://{host}:{port}")
     return httpd
 
 if __name__ == "__main__":
-    start_server().serve_forever()
+    started = time.perf_counter()
+    # exit through SystemExit on SIGTERM so write-behind data is flushed and the snapshot saved at shutdown
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # held until exit, so archive_job cannot rewrite data/ under a running server
+    data_lock = lock_data()
+    if data_lock is None:
+        sys.exit("data/ is in use by another server or archive_job")
+    source = snapshot.start()
+    httpd = start_server(port=int(os.environ.get("PORT", 5000)))
+    print(f"Started in {(time.perf_counter() - started) * 1000:.0f} ms from {source}", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
 
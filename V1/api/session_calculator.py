@@ -1,12 +1,13 @@
 from datetime import datetime
-from storage_utils import load_payment_data
+from storage_utils import iter_json
+from payment_archive import archived_totals
 from hashlib import md5
-import math
+from tariffs import compile_tariff
+from discounts import current as current_discounts
 import uuid
 
 
-def calculate_price(parkinglot, sid, data):
-    price = 0
+def calculate_price(parkinglot, sid, data, discounts=None, lid=None):
     start = datetime.strptime(data["started"], "%d-%m-%Y %H:%M:%S")
 
     if data.get("stopped"):
@@ -14,20 +15,10 @@ def calculate_price(parkinglot, sid, data):
     else:
         end = datetime.now()
 
-    diff = end - start
-    hours = math.ceil(diff.total_seconds() / 3600)
-
-    if diff.total_seconds() < 180:
-        price = 0
-    elif end.date() > start.date():
-        price = float(parkinglot.get("daytariff", 999)) * (diff.days + 1)
-    else:
-        price = float(parkinglot.get("tariff")) * hours
-
-        if price > float(parkinglot.get("daytariff", 999)):
-            price = float(parkinglot.get("daytariff", 999))
-
-    return (price, hours, diff.days + 1 if end.date() > start.date() else 0)
+    price, hours, days = compile_tariff(parkinglot).price(start, end)
+    if price:
+        price = (discounts or current_discounts()).apply(price, data.get("user"), lid, data.get("discount"), start)
+    return (price, hours, days)
 
 
 def generate_payment_hash(sid, data):
@@ -39,11 +30,24 @@ def generate_transaction_validation_hash():
 
 
 def check_payment_amount(hash):
-    payments = load_payment_data()
-    total = 0
+    return check_payment_amounts([hash])[hash]
+
+
+def check_payment_amounts(hashes):
+    archived = archived_totals()
+    totals = {hash: archived.get(hash, 0) for hash in hashes}
+
+    for payment in iter_json('data/payments.json'):
+        if payment["transaction"] in totals:
+            totals[payment["transaction"]] += payment["amount"]
+
+    return totals
+
+
+def payment_totals():
+    totals = dict(archived_totals())
 
-    for payment in payments:
-        if payment["transaction"] == hash:
-            total += payment["amount"]
+    for payment in iter_json('data/payments.json'):
+        totals[payment["transaction"]] = totals.get(payment["transaction"], 0) + payment["amount"]
 
-    return total
\ No newline at end of file
+    return totals
@@ -0,0 +1,81 @@
+import sys
+from bisect import insort, bisect_left
+from storage_utils import read_snapshot
+import session_store
+from session_store import normalize_plate
+from session_records import SessionRecord
+from file_index import FileIndex
+
+LOTS_FILE = 'data/parking-lots.json'
+
+# plates: normalized plate -> [(started seconds, lot id, session id)], sorted
+# sessions: (lot id, session id) -> SessionRecord
+# Built from every lot's sessions and checked against the hot file of every
+# lot; adding or deleting a lot changes that set of files. The session handlers
+# keep the index current. Archiving moves sessions without changing their lot
+# and id, but it rewrites the hot files, so a rebuild after it finds the same
+# sessions.
+
+
+def _add(tables, lid, sid, session):
+    record = SessionRecord(session)
+    plate = sys.intern(normalize_plate(record.licenseplate))
+    insort(tables["plates"].setdefault(plate, []), (record.started, lid, sid))
+    tables["sessions"][(lid, sid)] = record
+
+
+def _files():
+    return [session_store.hot_file(lid) for lid in read_snapshot(LOTS_FILE)]
+
+
+def _build():
+    tables = {"plates": {}, "sessions": {}}
+    for lid in read_snapshot(LOTS_FILE):
+        for sid, session in session_store.iter_sessions(lid):
+            _add(tables, lid, sid, session)
+    return tables
+
+
+_index = FileIndex(_files, _build, plates={}, sessions={})
+_state = _index.state
+
+
+def _discard(lid, sid):
+    record = _state["sessions"].pop((lid, sid), None)
+    if record is None:
+        return
+    plate = normalize_plate(record.licenseplate)
+    refs = _state["plates"][plate]
+    del refs[bisect_left(refs, (record.started, lid, sid))]
+    if not refs:
+        del _state["plates"][plate]
+
+
+def history(licenseplate, user=None, offset=0, limit=50):
+    """Return (total, sessions) for a plate, newest first, as one page of
+    session dicts with their lot and id added."""
+    with _index.lock:
+        _index.ensure()
+        refs = _state["plates"].get(normalize_plate(licenseplate), [])
+        matches = [(lid, sid) for _, lid, sid in reversed(refs) if user is None or _state["sessions"][(lid, sid)].user == user]
+        page = [dict(_state["sessions"][ref], parkinglot=ref[0], id=ref[1]) for ref in matches[offset:offset + limit]]
+        return len(matches), page
+
+
+def record(lid, sid, session):
+    """Record a started or stopped session, after its lot file was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _discard(lid, sid)
+        _add(_state, lid, sid, session)
+        _index.saved()
+
+
+def remove(lid, sid):
+    """Forget a deleted session, after its lot file was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _discard(lid, sid)
+        _index.saved()
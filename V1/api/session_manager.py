@@ -1,13 +1,102 @@
+"""Login sessions.
+
+By default a token is a random uuid that is only known to the process that
+issued it. With PARKING_TOKEN_SECRET set, tokens are signed instead:
+
+    base64url(json {"username", "name", "role", "exp", "jti"}) "." base64url(hmac-sha256)
+
+Any process holding the same secret can verify them without shared state.
+They expire after PARKING_TOKEN_TTL seconds (default 24 hours). Logging out
+puts the token's id on a deny-list in data/revoked-tokens.json until the
+token would have expired anyway, so every process sharing the data
+directory sees the revocation.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from storage_utils import write_lock, read_snapshot, load_json, save_data
+
+SECRET = os.environ.get("PARKING_TOKEN_SECRET", "").encode("utf-8")
+TOKEN_TTL = int(os.environ.get("PARKING_TOKEN_TTL", 24 * 3600))
+REVOKED_FILE = 'data/revoked-tokens.json'
+
 sessions = {}
 
 
+def _encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _encode(hmac.new(SECRET, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def _verify(token):
+    # tokens only ever hold base64url text; anything else is not one of ours
+    if not token.isascii():
+        return None
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), (int, float)) or claims["exp"] < time.time():
+        return None
+    return claims
+
+
+def create_token(user):
+    if not SECRET:
+        token = str(uuid.uuid4())
+        add_session(token, user)
+        return token
+    claims = {
+        "username": user["username"],
+        "name": user.get("name"),
+        "role": user.get("role"),
+        "exp": int(time.time()) + TOKEN_TTL,
+        "jti": uuid.uuid4().hex
+    }
+    payload = _encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return payload + "." + _sign(payload)
+
+
 def add_session(token, user):
     sessions[token] = user
 
 
 def remove_session(token):
+    if SECRET and "." in token:
+        claims = _verify(token)
+        if claims is None:
+            return None
+        with write_lock:
+            now = time.time()
+            revoked = {jti: exp for jti, exp in (load_json(REVOKED_FILE) or {}).items() if exp >= now}
+            revoked[claims["jti"]] = claims["exp"]
+            save_data(REVOKED_FILE, revoked)
+        return _user(claims)
     return sessions.pop(token, None)
 
 
+def _user(claims):
+    return {key: claims[key] for key in ("username", "name", "role") if claims.get(key) is not None}
+
+
 def get_session(token):
-    return sessions.get(token)
\ No newline at end of file
+    if SECRET and token and "." in token:
+        claims = _verify(token)
+        if claims is None or claims["jti"] in (read_snapshot(REVOKED_FILE) or {}):
+            return None
+        return _user(claims)
+    return sessions.get(token)
@@ -0,0 +1,64 @@
+"""Compact in-memory sessions.
+
+A session dict parsed from json costs several hundred bytes: its own hash
+table, a copy of the plate and username strings and two formatted dates.
+`SessionRecord` keeps the same data in slots instead, with interned plate
+and username strings (shared by all sessions of a vehicle or user) and the
+times as integer seconds since archive_segments.EPOCH. Fields other than
+the standard ones go into `extra`, which stays None for most sessions.
+
+A record is a read-only Mapping that looks like the session dict it was
+made from, dates formatted as in the data files, so `record["started"]`,
+`record.get("user")` and `dict(record)` work as before.
+"""
+import sys
+from collections.abc import Mapping
+import archive_segments as seg
+from session_store import DATE_FORMAT, SESSION_FIELDS, parse_time
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _seconds(value):
+    return seg.to_seconds(parse_time(value)) if value else None
+
+
+def _format(seconds):
+    return seg.from_seconds(seconds).strftime(DATE_FORMAT) if seconds is not None else None
+
+
+class SessionRecord(Mapping):
+    __slots__ = ("licenseplate", "user", "started", "stopped", "extra")
+
+    def __init__(self, session):
+        self.licenseplate = _intern(session.get("licenseplate"))
+        self.user = _intern(session.get("user"))
+        self.started = _seconds(session["started"])
+        self.stopped = _seconds(session.get("stopped"))
+        self.extra = {key: value for key, value in session.items() if key not in SESSION_FIELDS} or None
+
+    def __getitem__(self, key):
+        if key == "licenseplate":
+            return self.licenseplate
+        if key == "user":
+            return self.user
+        if key == "started":
+            return _format(self.started)
+        if key == "stopped":
+            return _format(self.stopped)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from SESSION_FIELDS
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(SESSION_FIELDS) + len(self.extra or ())
+
+    def __repr__(self):
+        return f"SessionRecord({dict(self)!r})"
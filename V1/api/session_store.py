@@ -0,0 +1,206 @@
+"""Per-lot parking session storage.
+
+Every lot has a small hot file, data/pdata/p{lid}-sessions.json, holding the
+open and recently finished sessions that start/stop touch. Finished sessions
+of older months are moved by `archive_sessions` into one compressed segment
+per month under data/pdata/archive/ (see archive_segments), with a per-lot
+manifest recording for every month the session ids and times it holds, bloom
+filters of its users and plates, and the highest id ever issued. Monthly
+partitions written as plain json by an earlier layout are converted by
+archive_job before anything else reads the archive.
+"""
+import os
+from datetime import datetime, timedelta
+from storage_utils import write_lock, read_snapshot, load_json, iter_json, save_data
+import archive_segments as seg
+
+DATE_FORMAT = "%d-%m-%Y %H:%M:%S"
+ARCHIVE_DIR = 'data/pdata/archive'
+
+
+def hot_file(lid):
+    return f'data/pdata/p{lid}-sessions.json'
+
+
+def partition_file(lid, month):
+    return f'{ARCHIVE_DIR}/p{lid}-{month}.seg'
+
+
+def manifest_file(lid):
+    return f'{ARCHIVE_DIR}/p{lid}-manifest.json'
+
+
+def parse_time(value):
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def normalize_plate(licenseplate):
+    return str(licenseplate).replace("-", "").replace(" ", "").upper()
+
+
+SESSION_FIELDS = ["licenseplate", "started", "stopped", "user"]
+
+
+def _to_columns(sessions):
+    columns = {"sid": [], "licenseplate": [], "user": [], "started": [], "stopped": [], "extra": []}
+    for sid, session in sessions.items():
+        columns["sid"].append(sid)
+        columns["licenseplate"].append(session.get("licenseplate"))
+        columns["user"].append(session.get("user"))
+        columns["started"].append(seg.to_seconds(parse_time(session["started"])))
+        columns["stopped"].append(seg.to_seconds(parse_time(session["stopped"])) if session.get("stopped") else None)
+        columns["extra"].append({k: v for k, v in session.items() if k not in SESSION_FIELDS} or None)
+    return columns
+
+
+def _from_row(row):
+    session = {
+        "licenseplate": row["licenseplate"],
+        "started": seg.from_seconds(row["started"]).strftime(DATE_FORMAT),
+        "stopped": seg.from_seconds(row["stopped"]).strftime(DATE_FORMAT) if row["stopped"] is not None else None,
+        "user": row["user"]
+    }
+    if row["extra"]:
+        session.update(row["extra"])
+    return session
+
+
+def write_partition(lid, month, partition, filename=None):
+    columns = _to_columns(partition)
+    ids = [int(sid) for sid in partition if sid.isdigit()] or [0]
+    min_time, max_time = min(columns["started"]), max(columns["started"])
+    seg.write_segment(filename or partition_file(lid, month), "sessions", columns, min_time, max_time)
+    return {
+        "format": "segment",
+        "count": len(partition),
+        "min_sid": min(ids),
+        "max_sid": max(ids),
+        "min_time": min_time,
+        "max_time": max_time,
+        "users": seg.bloom(columns["user"]),
+        "plates": seg.bloom(normalize_plate(p) for p in columns["licenseplate"])
+    }
+
+
+def _read_partition(lid, month, info, since=None, until=None, user=None, plate=None):
+    if user is not None and not seg.might_contain(info["users"], user):
+        return
+    if plate is not None and not seg.might_contain(info["plates"], plate):
+        return
+    filters = {}
+    if since is not None or until is not None:
+        low = seg.to_seconds(since) if since is not None else None
+        high = seg.to_seconds(until) if until is not None else None
+        filters["started"] = lambda value: (low is None or value >= low) and (high is None or value <= high)
+    if user is not None:
+        filters["user"] = lambda value: value == user
+    if plate is not None:
+        filters["licenseplate"] = lambda value: normalize_plate(value) == plate
+    for row in seg.read_rows(partition_file(lid, month), filters):
+        yield row["sid"], _from_row(row)
+
+
+def load_sessions(lid):
+    return load_json(hot_file(lid)) or {}
+
+
+def save_sessions(lid, sessions, defer=False):
+    save_data(hot_file(lid), sessions, defer)
+
+
+def load_manifest(lid):
+    return load_json(manifest_file(lid)) or {"last_sid": 0, "partitions": {}}
+
+
+def next_session_id(lid, sessions):
+    return str(max([int(sid) for sid in sessions if sid.isdigit()] + [load_manifest(lid)["last_sid"]]) + 1)
+
+
+def partitions_for(lid, since=None, until=None):
+    partitions = []
+    for month, info in sorted(load_manifest(lid)["partitions"].items()):
+        first, last = seg.from_seconds(info["min_time"]), seg.from_seconds(info["max_time"] + 1)
+        if (since is None or last > since) and (until is None or first <= until):
+            partitions.append((month, info))
+    return partitions
+
+
+def iter_sessions(lid, since=None, until=None, user=None, plate=None):
+    plate = normalize_plate(plate) if plate is not None else None
+    for month, info in partitions_for(lid, since, until):
+        yield from _read_partition(lid, month, info, since, until, user, plate)
+    for sid, session in iter_json(hot_file(lid)):
+        if user is not None and session.get("user") != user:
+            continue
+        if plate is not None and normalize_plate(session.get("licenseplate")) != plate:
+            continue
+        if since is not None or until is not None:
+            started = parse_time(session["started"])
+            if (since is not None and started < since) or (until is not None and started > until):
+                continue
+        yield sid, session
+
+
+def count_open(lid):
+    return sum(1 for _, session in iter_json(hot_file(lid)) if not session.get("stopped"))
+
+
+def find_session(lid, sid):
+    sessions = load_sessions(lid)
+    if sid in sessions:
+        return sessions[sid]
+    if not sid.isdigit():
+        return None
+    for month, info in load_manifest(lid)["partitions"].items():
+        if info["min_sid"] <= int(sid) <= info["max_sid"]:
+            for row in seg.read_rows(partition_file(lid, month), {"sid": lambda value: value == sid}):
+                return _from_row(row)
+    return None
+
+
+def _load_partition(lid, month):
+    return {row["sid"]: _from_row(row) for row in seg.read_rows(partition_file(lid, month))}
+
+
+def archive_sessions(lid, keep_days=30, now=None):
+    """Move the lot's sessions that finished before the retention window
+    into their monthly segments. The segments are built without write_lock;
+    it is only held to drop the moved sessions from the hot file, put the
+    segments in place and save the manifest. When a moved session was changed
+    or deleted in the meantime nothing is archived; the next run retries."""
+    cutoff = ((now or datetime.now()) - timedelta(days=keep_days)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    months = {}
+    for sid, session in (read_snapshot(hot_file(lid)) or {}).items():
+        if not session.get("stopped"):
+            continue
+        started = parse_time(session["started"])
+        if started < cutoff:
+            months.setdefault(started.strftime("%Y-%m"), {})[sid] = session
+    if not months:
+        return 0
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    manifest = load_manifest(lid)
+    infos = {}
+    for month, moved in months.items():
+        # a partition is only rewritten when a long-running session of that month finishes late
+        partition = _load_partition(lid, month) if month in manifest["partitions"] else {}
+        partition.update(moved)
+        infos[month] = write_partition(lid, month, partition, partition_file(lid, month) + '.new')
+
+    with write_lock:
+        sessions = read_snapshot(hot_file(lid)) or {}
+        if any(sessions.get(sid) != session for moved in months.values() for sid, session in moved.items()):
+            for month in months:
+                os.remove(partition_file(lid, month) + '.new')
+            return 0
+        manifest = load_manifest(lid)
+        for month, info in infos.items():
+            os.replace(partition_file(lid, month) + '.new', partition_file(lid, month))
+            manifest["partitions"][month] = info
+            manifest["last_sid"] = max(manifest["last_sid"], info["max_sid"])
+        manifest["last_sid"] = max([manifest["last_sid"]] + [int(sid) for sid in sessions if sid.isdigit()])
+        save_data(manifest_file(lid), manifest)
+        archived = {sid for moved in months.values() for sid in moved}
+        save_sessions(lid, {sid: session for sid, session in sessions.items() if sid not in archived})
+    return len(archived)
@@ -0,0 +1,123 @@
+"""Binary snapshot of the parsed data files and lookup indexes.
+
+`save` pickles the published file snapshots of storage_utils and the state
+of every index module into data/snapshot.bin, together with the mtime of
+each json file under data/; only copying the states takes their locks.
+`load` restores them only when the snapshot was written by this VERSION and
+every one of those files is unchanged; otherwise the server rebuilds
+everything from the json files with `warm`.
+
+`start` does one or the other at boot, then saves again every
+PARKING_SNAPSHOT_INTERVAL seconds (default 300, 0 disables) and at exit.
+"""
+import atexit
+import glob
+import os
+import pickle
+import threading
+import time
+import storage_utils
+import vehicle_index
+import reservation_store
+import session_index
+import payment_index
+import payment_archive
+
+SNAPSHOT_FILE = 'data/snapshot.bin'
+MAGIC = b"PSNAP\n"
+VERSION = 6
+INTERVAL = float(os.environ.get("PARKING_SNAPSHOT_INTERVAL", 300))
+SOURCES = ['data/*.json', 'data/pdata/*.json', 'data/pdata/archive/*.json', 'data/archive/*.json']
+
+# name -> (state dict, lock guarding it)
+STATES = {
+    "vehicles": (vehicle_index._index.state, vehicle_index._index.lock),
+    "reservations": (reservation_store._index.state, reservation_store._index.lock),
+    "sessions": (session_index._index.state, session_index._index.lock),
+    "payments": (payment_index._index.state, payment_index._index.lock),
+    "payment_totals": (payment_archive._totals, threading.Lock()),
+    "files": (storage_utils._published, storage_utils.write_lock)
+}
+
+
+def _sources():
+    sources = {}
+    for pattern in SOURCES:
+        for filename in glob.glob(pattern):
+            sources[filename] = os.stat(filename).st_mtime_ns
+    return sources
+
+
+def _copy(state):
+    # the states are changed in place two levels deep - a table, then the dict
+    # or list under one of its keys - while the records below that are replaced,
+    # never changed, so this copy stays consistent after the lock is released
+    return {
+        name: {key: value.copy() if isinstance(value, (dict, list)) else value for key, value in table.items()} if isinstance(table, dict) else table
+        for name, table in state.items()
+    }
+
+
+def save():
+    storage_utils.flush()
+    with storage_utils.write_lock:
+        sources = _sources()
+        # a file saved with write-behind since the flush does not hold what the
+        # indexes hold yet; a snapshot taken now must not match it on load
+        for filename in storage_utils._pending:
+            sources[filename] = None
+    # copies are taken under each state's own lock; pickling runs without any
+    # lock, so requests are not held up by it
+    states = {}
+    for name, (state, lock) in STATES.items():
+        with lock:
+            states[name] = _copy(state)
+    tmp = SNAPSHOT_FILE + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(MAGIC)
+        pickle.dump({"version": VERSION, "created": time.time(), "sources": sources, "states": states}, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, SNAPSHOT_FILE)
+
+
+def load():
+    try:
+        with open(SNAPSHOT_FILE, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return False
+            snapshot = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return False
+    if snapshot.get("version") != VERSION or snapshot["sources"] != _sources():
+        return False
+    for name, (state, lock) in STATES.items():
+        with lock:
+            state.clear()
+            state.update(snapshot["states"][name])
+    return True
+
+
+def warm():
+    for filename in ('data/users.json', 'data/parking-lots.json', 'data/vehicles.json', 'data/reservations.json'):
+        storage_utils.read_snapshot(filename)
+    vehicle_index.lookup("")
+    reservation_store.get("")
+    session_index.history("")
+    payment_index.for_user("")
+    payment_archive.archived_totals()
+
+
+def _save_loop():
+    while True:
+        time.sleep(INTERVAL)
+        save()
+
+
+def start():
+    """Restore the snapshot or rebuild from the json files, and return which."""
+    source = "snapshot" if load() else "full rebuild"
+    if source != "snapshot":
+        warm()
+    atexit.register(save)
+    if INTERVAL > 0:
+        threading.Thread(target=_save_loop, name="snapshot-writer", daemon=True).start()
+    return source
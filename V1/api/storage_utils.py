@@ -1,34 +1,267 @@
+"""Data file storage.
+
+Files read through `read_snapshot` are kept in memory as published, immutable
+snapshots. Readers get the current snapshot without taking a lock and must
+not modify it. Writers run under `write_lock`, get a private copy from
+`load_json`, and `save_data` swaps their new version in as the snapshot. A
+snapshot is reloaded when its file is changed by anything else.
+
+Write-behind mode (PARKING_WRITE_BEHIND=1) lets callers save json files with
+`defer=True`: the data is kept in memory, loads of that file return it, and a
+background thread writes it every PARKING_FLUSH_INTERVAL seconds (default 1)
+and at shutdown. A crash or kill -9 loses deferred changes made in the last
+flush interval; saves without `defer` are always written before returning.
+"""
+import atexit
 import json
 import csv
+import os
+import threading
+import time
+import metrics
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+WRITE_BEHIND = os.environ.get("PARKING_WRITE_BEHIND") == "1"
+FLUSH_INTERVAL = float(os.environ.get("PARKING_FLUSH_INTERVAL", 1.0))
+DATA_LOCK_FILE = 'data/.lock'
+
+write_lock = threading.RLock()
+_io_lock = threading.Lock()
+_published = {}
+_pending = {}
+_generation = {}
+_written = {}
+_flusher = None
+_MISSING = object()
+
+
+def _clone(data):
+    if isinstance(data, dict):
+        return {key: _clone(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_clone(value) for value in data]
+    return data
+
+
+def _mtime(filename):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
 
-def load_json(filename):
+def _load_file(filename):
+    start = time.perf_counter()
     try:
         with open(filename, 'r') as file:
             return json.load(file)
     except FileNotFoundError:
         return []
+    finally:
+        metrics.observe_storage('load', filename, time.perf_counter() - start)
 
 
-def write_json(filename, data):
-    with open(filename, 'w') as file:
-        json.dump(data, file, default=str)
+def _current(filename):
+    data = _pending.get(filename, _MISSING)
+    if data is not _MISSING:
+        return data
+    published = _published.get(filename)
+    if published is not None and published[1] == _mtime(filename):
+        return published[0]
+    return _MISSING
+
+
+def read_snapshot(filename):
+    data = _current(filename)
+    if data is _MISSING:
+        mtime = _mtime(filename)
+        data = _load_file(filename)
+        _published[filename] = (data, mtime)
+    return data
+
+
+def is_pending(filename):
+    return filename in _pending
+
+
+def written_mtime(filename):
+    """The mtime the file got from the last write this process made to it."""
+    return _written.get(filename)
+
+
+def load_json(filename):
+    data = _current(filename)
+    if data is not _MISSING:
+        return _clone(data)
+    return _load_file(filename)
+
+
+def iter_json(filename, chunk_size=1 << 16):
+    """Yield the items of a top-level json array, or the (key, value) pairs
+    of a top-level object, one at a time without loading the whole file."""
+    data = _pending.get(filename, _MISSING)
+    if data is not _MISSING:
+        yield from data.items() if isinstance(data, dict) else data
+        return
+    start = time.perf_counter()
+    decoder = json.JSONDecoder()
+    try:
+        with open(filename, 'r') as file:
+            buffer = file.read(chunk_size)
+            pos = 0
+            eof = not buffer
+
+            def skip(pos, chars=' \t\r\n'):
+                nonlocal buffer, eof
+                while True:
+                    while pos < len(buffer) and buffer[pos] in chars:
+                        pos += 1
+                    if pos < len(buffer) or eof:
+                        return pos
+                    buffer, pos = file.read(chunk_size), 0
+                    eof = not buffer
+
+            def decode(pos):
+                nonlocal buffer, eof
+                while True:
+                    try:
+                        value, end = decoder.raw_decode(buffer, pos)
+                        # a number cut off by the end of the buffer may continue in the next chunk
+                        if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,:]}'):
+                            return value, end
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                    chunk = file.read(chunk_size)
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+
+            pos = skip(pos)
+            if pos >= len(buffer):
+                return
+            opening = buffer[pos]
+            if opening not in '[{':
+                raise ValueError(f"{filename} does not hold a json array or object")
+            closing = ']' if opening == '[' else '}'
+            pos += 1
+            while True:
+                pos = skip(pos, ' \t\r\n,')
+                if pos >= len(buffer):
+                    raise ValueError(f"{filename} ends before the closing {closing}")
+                if buffer[pos] == closing:
+                    return
+                if opening == '{':
+                    key, pos = decode(pos)
+                    pos = skip(pos, ' \t\r\n:')
+                    value, pos = decode(pos)
+                    yield key, value
+                else:
+                    value, pos = decode(pos)
+                    yield value
+    except FileNotFoundError:
+        return
+    finally:
+        metrics.observe_storage('stream', filename, time.perf_counter() - start)
+
+
+def write_json(filename, data, defer=False):
+    with write_lock:
+        _generation[filename] = _generation.get(filename, 0) + 1
+        if defer and WRITE_BEHIND:
+            _pending[filename] = data
+            _start_flusher()
+            metrics.observe_storage('defer', filename, 0.0)
+            return
+        _pending.pop(filename, None)
+        with _io_lock:
+            _write_file(filename, json.dumps(data, default=str))
+            _written[filename] = _mtime(filename)
+            if filename in _published:
+                _published[filename] = (data, _mtime(filename))
+
+
+def _write_file(filename, text):
+    start = time.perf_counter()
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as file:
+        file.write(text)
+    os.replace(tmp, filename)
+    metrics.observe_storage('save', filename, time.perf_counter() - start)
+
+
+def flush():
+    with write_lock:
+        batch = [(filename, _generation[filename], data) for filename, data in _pending.items()]
+    for filename, generation, data in batch:
+        # pending data is never modified in place, so it can be serialized without the lock
+        text = json.dumps(data, default=str)
+        with _io_lock:
+            if _generation.get(filename) != generation:
+                continue
+            _write_file(filename, text)
+            _written[filename] = _mtime(filename)
+        with write_lock:
+            if _generation.get(filename) == generation:
+                _pending.pop(filename, None)
+                if filename in _published:
+                    _published[filename] = (data, _mtime(filename))
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, name="storage-flusher", daemon=True)
+        _flusher.start()
+        atexit.register(flush)
+
+
+def lock_data():
+    """Take the lock that lets one process at a time - the server or
+    archive_job - write the files under data/. Returns the open lock file,
+    to be kept for as long as the lock is needed, or None when another process
+    holds it."""
+    file = open(DATA_LOCK_FILE, 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        file.close()
+        return None
+    return file
 
 
 def load_csv(filename):
+    start = time.perf_counter()
     try:
         with open(filename, 'r') as file:
             reader = csv.reader(file)
             return [row for row in reader]
     except FileNotFoundError:
         return []
+    finally:
+        metrics.observe_storage('load', filename, time.perf_counter() - start)
 
 
 def write_csv(filename, data):
+    start = time.perf_counter()
     with open(filename, 'w', newline='') as file:
         writer = csv.writer(file)
         for row in data:
             writer.writerow(row)
+    metrics.observe_storage('save', filename, time.perf_counter() - start)
 
 
 def load_text(filename):
@@ -45,9 +278,9 @@ def write_text(filename, data):
             file.write(line + '\n')
 
 
-def save_data(filename, data):
+def save_data(filename, data, defer=False):
     if filename.endswith('.json'):
-        write_json(filename, data)
+        write_json(filename, data, defer)
     elif filename.endswith('.csv'):
         write_csv(filename, data)
     elif filename.endswith('.txt'):
@@ -0,0 +1,156 @@
+"""Parking lot tariffs compiled into weekly price tables.
+
+A lot is charged its hourly `tariff`, capped at `daytariff` for a single
+day. An optional `schedule` overrides the hourly rate for parts of the week:
+
+    "schedule": [
+        {"days": ["sat", "sun"], "tariff": 1.5},
+        {"days": ["mon", "tue", "wed", "thu", "fri"], "from": "18:00", "to": "07:00", "tariff": 1.0}
+    ]
+
+`days` defaults to every day, `from`/`to` to the whole day, and a band whose
+`to` is before its `from` runs past midnight into the next day. Later bands
+win where bands overlap.
+
+A scheduled stay is billed in whole hours from its start, each at the rate
+in force at that time, and every calendar day it touches costs at most
+`daytariff`. Times are the naive local times stored with the sessions, so
+bands follow the wall clock across daylight saving changes and a stay is
+as long as its wall clock times say. Lots without a schedule keep their
+original pricing: `tariff` per hour up to `daytariff`, and `daytariff` for
+every day of a stay that runs past midnight.
+
+`compile_tariff` turns these fields into the week's rate boundaries and the
+cumulative cost at every boundary. A stay is priced one calendar day at a
+time, so its cost grows with the number of days it touches, plus two binary
+searches per day. Compiled tariffs are cached on the
+tariff fields, so an edited lot is compiled again on its next use, and
+remembered per lot dict, as published lot snapshots are never modified.
+"""
+import json
+import math
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+DAY = 86400
+WEEK = 7 * DAY
+MONDAY = datetime(2000, 1, 3)
+
+_compiled = {}
+_by_lot = {}
+
+
+class Tariff:
+    def __init__(self, tariff, daytariff, bounds, rates):
+        self.tariff = tariff
+        self.daytariff = daytariff
+        self.bounds = bounds
+        self.rates = rates
+        self.cumulative = [0.0]
+        for i, rate in enumerate(rates):
+            self.cumulative.append(self.cumulative[-1] + rate * (bounds[i + 1] - bounds[i]) / 3600)
+        self.flat = len(rates) == 1
+
+    def _cost_until(self, seconds):
+        weeks, offset = divmod(seconds, WEEK)
+        i = bisect_right(self.bounds, offset) - 1
+        return weeks * self.cumulative[-1] + self.cumulative[i] + self.rates[i] * (offset - self.bounds[i]) / 3600
+
+    def _cost(self, start, end):
+        offset = (start - MONDAY).total_seconds()
+        return self._cost_until(offset + (end - start).total_seconds()) - self._cost_until(offset)
+
+    def price(self, start, end):
+        diff = end - start
+        hours = math.ceil(diff.total_seconds() / 3600)
+        if diff.total_seconds() < 180:
+            return 0, hours, 0
+        if self.flat:
+            if end.date() > start.date():
+                return self.daytariff * (diff.days + 1), hours, diff.days + 1
+            return min(self.rates[0] * hours, self.daytariff), hours, 0
+        # whole hours are billed from the start of the stay, at the rates in force
+        # during them, and every calendar day costs at most the day tariff
+        billed_until = start + timedelta(hours=hours)
+        price = 0.0
+        days = 0
+        while start < billed_until:
+            midnight = datetime.combine(start.date() + timedelta(days=1), time())
+            until = min(midnight, billed_until)
+            price += min(self._cost(start, until), self.daytariff)
+            days += 1
+            start = until
+        return round(price, 2), hours, days if days > 1 else 0
+
+
+def _seconds(value, field):
+    try:
+        hours, minutes = (int(part) for part in value.split(":"))
+    except (AttributeError, ValueError):
+        raise ValueError(f"{field} must be HH:MM")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f"{field} must be HH:MM")
+    return hours * 3600 + minutes * 60
+
+
+def _band_ranges(band):
+    days = band.get("days", DAYS)
+    if not isinstance(days, list) or any(day not in DAYS for day in days):
+        raise ValueError(f"days must be a list of {', '.join(DAYS)}")
+    start = _seconds(band.get("from", "00:00"), "from")
+    end = _seconds(band.get("to", "24:00"), "to")
+    length = end - start if end > start else DAY - start + end
+    for day in days:
+        first = DAYS.index(day) * DAY + start
+        if first + length <= WEEK:
+            yield first, first + length
+        else:
+            yield first, WEEK
+            yield 0, first + length - WEEK
+
+
+def _compile(parkinglot):
+    tariff = float(parkinglot.get("tariff"))
+    daytariff = float(parkinglot.get("daytariff", 999))
+    schedule = parkinglot.get("schedule") or []
+    if not isinstance(schedule, list):
+        raise ValueError("schedule must be a list of bands")
+    ranges = []
+    for band in schedule:
+        if not isinstance(band, dict) or "tariff" not in band:
+            raise ValueError("every schedule band needs a tariff")
+        try:
+            rate = float(band["tariff"])
+        except (TypeError, ValueError):
+            raise ValueError("schedule band tariff must be a number")
+        ranges.extend((first, last, rate) for first, last in _band_ranges(band))
+
+    points = sorted({0, WEEK} | {first for first, _, _ in ranges} | {last for _, last, _ in ranges})
+    bounds = []
+    rates = []
+    for first, last in zip(points, points[1:]):
+        rate = tariff
+        for low, high, band_rate in ranges:
+            if low <= first and last <= high:
+                rate = band_rate
+        if not rates or rates[-1] != rate:
+            bounds.append(first)
+            rates.append(rate)
+    bounds.append(WEEK)
+    return Tariff(tariff, daytariff, bounds, rates)
+
+
+def compile_tariff(parkinglot):
+    entry = _by_lot.get(id(parkinglot))
+    if entry is not None and entry[0] is parkinglot:
+        return entry[1]
+    schedule = parkinglot.get("schedule")
+    key = (parkinglot.get("tariff"), parkinglot.get("daytariff", 999), json.dumps(schedule, sort_keys=True) if schedule else None)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = _compiled[key] = _compile(parkinglot)
+    if len(_by_lot) >= 1024:
+        _by_lot.clear()
+    _by_lot[id(parkinglot)] = (parkinglot, compiled)
+    return compiled
@@ -0,0 +1,70 @@
+from storage_utils import read_snapshot
+from session_store import normalize_plate
+from file_index import FileIndex
+
+VEHICLES_FILE = "data/vehicles.json"
+
+# plates: normalized plate -> {username: (vehicle key, vehicle)}
+# keys: (username, vehicle key) -> normalized plate
+# The handlers that write vehicles.json keep the index current.
+
+
+def _plate_of(key, vehicle):
+    return normalize_plate(vehicle.get("licenseplate") or key)
+
+
+def _build():
+    plates = {}
+    keys = {}
+    for username, uvehicles in (read_snapshot(VEHICLES_FILE) or {}).items():
+        for key, vehicle in uvehicles.items():
+            plate = _plate_of(key, vehicle)
+            plates.setdefault(plate, {})[username] = (key, vehicle)
+            keys[(username, key)] = plate
+    return {"plates": plates, "keys": keys}
+
+
+_index = FileIndex([VEHICLES_FILE], _build, plates={}, keys={})
+_state = _index.state
+
+
+def _unlink(username, key):
+    plate = _state["keys"].pop((username, key), None)
+    owners = _state["plates"].get(plate)
+    if owners is not None:
+        owners.pop(username, None)
+        if not owners:
+            del _state["plates"][plate]
+
+
+def lookup(licenseplate):
+    with _index.lock:
+        owners = _index.ensure()["plates"].get(normalize_plate(licenseplate), {})
+        return [{"username": username, "key": key, "vehicle": vehicle} for username, (key, vehicle) in owners.items()]
+
+
+def owner_of(licenseplate, username):
+    with _index.lock:
+        owner = _index.ensure()["plates"].get(normalize_plate(licenseplate), {}).get(username)
+        return owner[1] if owner else None
+
+
+def upsert(username, key, vehicle):
+    """Record a created or updated vehicle, after vehicles.json was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _unlink(username, key)
+        plate = _plate_of(key, vehicle)
+        _state["plates"].setdefault(plate, {})[username] = (key, vehicle)
+        _state["keys"][(username, key)] = plate
+        _index.saved()
+
+
+def remove(username, key):
+    """Forget a deleted vehicle, after vehicles.json was saved."""
+    with _index.lock:
+        if not _index.built:
+            return
+        _unlink(username, key)
+        _index.saved()
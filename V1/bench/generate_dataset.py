@@ -0,0 +1,126 @@
+"""Generate a deterministic synthetic data/ directory for the V1 API.
+
+    python V1/bench/generate_dataset.py out/ --users 1000 --lots 20 --sessions 500 --payments 5000
+
+Every user logs in with their username as password, `admin` is an ADMIN
+account. The same seed always produces the same files.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import session_calculator as sc
+
+BASE_DATE = datetime(2025, 1, 1)
+DATE_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+
+def plate(rng):
+    letters = "BDFGHJKLNPRSTVXZ"
+    return f"{rng.choice(letters)}{rng.choice(letters)}-{rng.randint(10, 99)}-{rng.choice(letters)}{rng.choice(letters)}"
+
+
+def generate(root, users=100, lots=5, sessions=200, payments=1000, seed=42):
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "data", "pdata"), exist_ok=True)
+
+    user_list = [{
+        "username": "admin",
+        "password": hashlib.md5(b"admin").hexdigest(),
+        "name": "Admin",
+        "role": "ADMIN"
+    }]
+    vehicles = {}
+    plates = {}
+    for i in range(users):
+        username = f"user{i}"
+        user_list.append({
+            "username": username,
+            "password": hashlib.md5(username.encode()).hexdigest(),
+            "name": f"User {i}",
+            "role": "USER"
+        })
+        plates[username] = []
+        vehicles[username] = {}
+        for _ in range(rng.randint(1, 2)):
+            licenseplate = plate(rng)
+            plates[username].append(licenseplate)
+            vehicles[username][licenseplate.replace("-", "")] = {
+                "licenseplate": licenseplate,
+                "name": rng.choice(["Golf", "Polo", "Civic", "Model 3", "Clio"]),
+                "created_at": str(BASE_DATE),
+                "updated_at": str(BASE_DATE)
+            }
+
+    parking_lots = {}
+    billable = []
+    for lid in range(1, lots + 1):
+        parking_lots[str(lid)] = {
+            "name": f"Lot {lid}",
+            "location": rng.choice(["Rotterdam", "Amsterdam", "Utrecht", "Den Haag"]),
+            "address": f"Street {lid}",
+            "capacity": rng.randint(50, 1000),
+            "reserved": 0,
+            "tariff": round(rng.uniform(1.5, 5.0), 2),
+            "daytariff": rng.randint(15, 40),
+            "coordinates": [round(rng.uniform(51.0, 53.0), 4), round(rng.uniform(4.0, 6.0), 4)]
+        }
+        lot_sessions = {}
+        for sid in range(1, sessions + 1):
+            username = f"user{rng.randrange(users)}" if users else "admin"
+            started = BASE_DATE + timedelta(minutes=rng.randrange(365 * 24 * 60))
+            stopped = started + timedelta(minutes=rng.randint(2, 600))
+            session = {
+                "licenseplate": rng.choice(plates[username]) if username in plates else plate(rng),
+                "started": started.strftime(DATE_FORMAT),
+                "stopped": stopped.strftime(DATE_FORMAT),
+                "user": username
+            }
+            lot_sessions[str(sid)] = session
+            billable.append((str(sid), session, parking_lots[str(lid)]))
+        with open(os.path.join(root, "data", "pdata", f"p{lid}-sessions.json"), "w") as file:
+            json.dump(lot_sessions, file)
+
+    payment_list = []
+    for _ in range(payments if billable else 0):
+        sid, session, parkinglot = rng.choice(billable)
+        amount = sc.calculate_price(parkinglot, sid, session)[0]
+        created = datetime.strptime(session["stopped"], DATE_FORMAT)
+        payment_list.append({
+            "transaction": sc.generate_payment_hash(sid, session),
+            "amount": amount,
+            "initiator": session["user"],
+            "created_at": created.strftime(DATE_FORMAT),
+            "completed": (created + timedelta(minutes=5)).strftime(DATE_FORMAT),
+            "hash": f"{rng.getrandbits(128):032x}",
+            "t_data": {}
+        })
+
+    for name, data in [("users.json", user_list), ("vehicles.json", vehicles), ("parking-lots.json", parking_lots),
+                       ("payments.json", payment_list), ("reservations.json", {})]:
+        with open(os.path.join(root, "data", name), "w") as file:
+            json.dump(data, file)
+    return {"users": len(user_list), "lots": lots, "sessions": lots * sessions, "payments": len(payment_list)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="directory that will contain data/")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--lots", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=200, help="sessions per lot")
+    parser.add_argument("--payments", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    counts = generate(args.root, args.users, args.lots, args.sessions, args.payments, args.seed)
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
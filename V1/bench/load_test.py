@@ -0,0 +1,198 @@
+"""Drive a running V1 server with a concurrent mixed workload.
+
+    python V1/bench/generate_dataset.py /tmp/bench --users 1000 --lots 20
+    python V1/bench/load_test.py --spawn /tmp/bench --duration 30 --concurrency 16
+
+With --spawn the server is started on --port from the given dataset root
+and stopped afterwards, otherwise --url must point at a running server.
+Reports throughput and p50/p95/p99 latency per route.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api", "server.py")
+
+DEFAULT_MIX = {"login": 1, "session": 4, "billing": 1, "payment": 2}
+
+
+class Client:
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+
+    def request(self, method, path, body=None, token=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+            headers["Content-Length"] = str(len(payload))
+        if token:
+            headers["Authorization"] = token
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, elapsed, ok):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def timed(client, recorder, route, method, path, body=None, token=None):
+    start = time.perf_counter()
+    try:
+        status, payload = client.request(method, path, body, token)
+    except OSError:
+        status, payload = 0, b""
+    recorder.record(route, time.perf_counter() - start, 200 <= status < 300)
+    return status, payload
+
+
+def login(client, recorder, username):
+    status, payload = timed(client, recorder, "POST /login", "POST", "/login", {"username": username, "password": username})
+    if status != 200:
+        return None
+    return json.loads(payload)["session_token"]
+
+
+def worker(wid, client, recorder, args, tokens, lots, deadline):
+    rng = random.Random(args.seed + wid)
+    ops = list(args.mix)
+    weights = [args.mix[op] for op in ops]
+    counter = 0
+    while time.perf_counter() < deadline:
+        op = rng.choices(ops, weights)[0]
+        token = rng.choice(tokens)
+        if op == "login":
+            login(client, recorder, f"user{rng.randrange(args.users)}")
+        elif op == "session":
+            counter += 1
+            lid = rng.choice(lots)
+            body = {"licenseplate": f"LT-{wid}-{counter}"}
+            timed(client, recorder, "POST /parking-lots/{lid}/sessions/start", "POST", f"/parking-lots/{lid}/sessions/start", body, token)
+            timed(client, recorder, "POST /parking-lots/{lid}/sessions/stop", "POST", f"/parking-lots/{lid}/sessions/stop", body, token)
+        elif op == "billing":
+            timed(client, recorder, "GET /billing", "GET", "/billing", token=token)
+        elif op == "payment":
+            body = {"transaction": f"{rng.getrandbits(128):032x}", "amount": round(rng.uniform(1, 40), 2)}
+            timed(client, recorder, "POST /payments", "POST", "/payments", body, token)
+
+
+def wait_for_server(client, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            client.request("GET", "/parking-lots/")
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def report(recorder, elapsed):
+    routes = {}
+    total = 0
+    for route, values in sorted(recorder.latencies.items()):
+        values.sort()
+        total += len(values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2)
+        }
+    return {"duration_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2), "routes": routes}
+
+
+def print_report(result):
+    print(f"{'route':<45} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, row in result["routes"].items():
+        print(f"{route:<45} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+    print(f"total: {result['requests']} requests in {result['duration_s']}s ({result['rps']} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="base url of a running server")
+    parser.add_argument("--spawn", metavar="ROOT", help="start the server from this dataset root")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=100, help="number of generated users to log in as")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX, help='weights, e.g. \'{"session": 4, "billing": 1}\'')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", metavar="FILE", help="also write the report as json")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    if args.spawn:
+        env = dict(os.environ, PORT=str(args.port))
+        # the load test is one client, so lift the per-client rate limits and queue bounds unless set explicitly
+        for name in ("GATE", "INTERACTIVE", "BATCH", "STREAM"):
+            env.setdefault(f"PARKING_LIMIT_{name}", "100000,100000,64,1024")
+        process = subprocess.Popen([sys.executable, SERVER], cwd=args.spawn, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = Client(url)
+    try:
+        if not wait_for_server(client):
+            sys.exit(f"server at {url} did not come up")
+        status, payload = client.request("GET", "/parking-lots/")
+        lots = list(json.loads(payload))
+        setup = Recorder()
+        tokens = [t for t in (login(client, setup, f"user{i}") for i in range(min(args.users, 50))) if t]
+        if not tokens or not lots:
+            sys.exit("could not log in or no parking lots found; is this a generated dataset?")
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        threads = [threading.Thread(target=worker, args=(i, client, recorder, args, tokens, lots, deadline)) for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result = report(recorder, time.perf_counter() - start)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure the memory held per session in the different in-memory forms.
+
+    python V1/bench/memory_bench.py --users 1000 --lots 20 --sessions 5000
+
+Generates a dataset (see generate_dataset.py) in a temporary directory and
+reports, as json, the bytes per session retained after loading every lot's
+sessions as json dicts, as SessionRecords, and after building the plate
+history index. Sizes come from tracemalloc, so they include the strings and
+containers a form keeps alive but not the interpreter's own overhead.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import session_store
+import session_index
+from session_records import SessionRecord
+from generate_dataset import generate
+
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def load_dicts(lots):
+    return [session_store.load_sessions(lid) for lid in lots]
+
+
+def load_records(lots):
+    return [{sid: SessionRecord(session) for sid, session in session_store.iter_sessions(lid)} for lid in lots]
+
+
+def build_index(lots):
+    session_index.history("")
+    return session_index._state
+
+
+def run(users, lots, sessions, seed):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        counts = generate(root, users, lots, sessions, 0, seed)
+        os.chdir(root)
+        try:
+            lot_ids = [str(lid) for lid in range(1, lots + 1)]
+            sizes = {
+                "dict": retained(lambda: load_dicts(lot_ids)),
+                "record": retained(lambda: load_records(lot_ids)),
+                "index": retained(lambda: build_index(lot_ids))
+            }
+        finally:
+            os.chdir(cwd)
+    total = counts["sessions"]
+    return {
+        "sessions": total,
+        "bytes_per_session": {name: round(size / total, 1) for name, size in sizes.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lots", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=2000, help="sessions per lot")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.lots, args.sessions, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""In-process microbenchmarks for storage_utils and session_calculator.
+
+    python V1/bench/microbench.py --save baseline.json
+    python V1/bench/microbench.py --compare baseline.json --threshold 0.15
+
+Results are printed as json (best-of-N nanoseconds per call). With
+--compare the run exits non-zero when a benchmark got slower than the
+baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import session_calculator as sc
+import storage_utils
+import schemas
+
+SIZES = [100, 1000, 10000]
+
+LOT = {"name": "Bench", "tariff": "2.50", "daytariff": "20"}
+SCHEDULED_LOT = dict(LOT, schedule=[
+    {"days": ["sat", "sun"], "tariff": 1.5},
+    {"days": ["mon", "tue", "wed", "thu", "fri"], "from": "18:00", "to": "07:00", "tariff": 1.0}
+])
+
+PRICE_CASES = {
+    "free": {"started": "01-03-2025 10:00:00", "stopped": "01-03-2025 10:02:00", "licenseplate": "AB-12-CD"},
+    "hourly": {"started": "01-03-2025 10:00:00", "stopped": "01-03-2025 13:20:00", "licenseplate": "AB-12-CD"},
+    "capped": {"started": "01-03-2025 07:00:00", "stopped": "01-03-2025 22:59:00", "licenseplate": "AB-12-CD"},
+    "multiday": {"started": "01-03-2025 10:00:00", "stopped": "04-03-2025 09:00:00", "licenseplate": "AB-12-CD"},
+    "open": {"started": "01-03-2025 10:00:00", "stopped": None, "licenseplate": "AB-12-CD"},
+}
+
+
+def payments(n):
+    return [{
+        "transaction": f"{i:032x}",
+        "amount": 12.5,
+        "initiator": f"user{i % 97}",
+        "created_at": "01-03-2025 10:00:00",
+        "completed": "01-03-2025 10:05:00",
+        "hash": f"{i * 7919:032x}",
+        "t_data": {}
+    } for i in range(n)]
+
+
+def measure(func, repeat):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return {"ns_per_op": round(best / number * 1e9, 1), "number": number}
+
+
+def benchmarks(workdir):
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    for n in SIZES:
+        filename = os.path.join(workdir, f"payments-{n}.json")
+        data = payments(n)
+        storage_utils.write_json(filename, data)
+        yield f"load_json[{n}]", lambda filename=filename: storage_utils.load_json(filename)
+        yield f"write_json[{n}]", lambda filename=filename, data=data: storage_utils.write_json(filename, data)
+
+    for case, session in PRICE_CASES.items():
+        yield f"calculate_price[{case}]", lambda session=session: sc.calculate_price(LOT, "1", session)
+    session = PRICE_CASES["capped"]
+    yield "calculate_price[scheduled]", lambda: sc.calculate_price(SCHEDULED_LOT, "1", session)
+
+    body = {"licenseplate": "AB-12-CD"}
+    yield "validate[session]", lambda: schemas.VALIDATORS["session"](body)
+
+    session = PRICE_CASES["hourly"]
+    yield "generate_payment_hash", lambda: sc.generate_payment_hash("1", session)
+
+    for n in SIZES:
+        def setup(n=n):
+            storage_utils.write_json(os.path.join(workdir, "data", "payments.json"), payments(n))
+        yield f"check_payment_amount[{n}]", (setup, lambda n=n: sc.check_payment_amount(f"{n // 2:032x}"))
+
+
+def run(filter_text=None, repeat=5):
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for name, func in benchmarks(workdir):
+                if filter_text and filter_text not in name:
+                    continue
+                if isinstance(func, tuple):
+                    setup, func = func
+                    setup()
+                results[name] = measure(func, repeat)
+        finally:
+            os.chdir(cwd)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": datetime.now().isoformat(timespec="seconds")
+        },
+        "results": results
+    }
+
+
+def compare(current, baseline, threshold):
+    rows = []
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            rows.append({"name": name, "ns_per_op": result["ns_per_op"], "baseline": None, "change": None})
+            continue
+        change = result["ns_per_op"] / before["ns_per_op"] - 1
+        rows.append({"name": name, "ns_per_op": result["ns_per_op"], "baseline": before["ns_per_op"], "change": round(change, 4)})
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", metavar="FILE", help="write the results to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before failing (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    current = run(args.filter, args.repeat)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(current, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        rows, regressions = compare(current, baseline, args.threshold)
+        print(json.dumps({"comparison": rows, "regressions": regressions}, indent=2))
+        sys.exit(1 if regressions else 0)
+    print(json.dumps(current, indent=2))
+
+
+if __name__ == "__main__":
+    main()
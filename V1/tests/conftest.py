@@ -0,0 +1,82 @@
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import storage_utils
+
+
+def _md5(text):
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A working directory with a small data/ tree: users admin and bob (password = username) and lot 1."""
+    os.makedirs(tmp_path / "data" / "pdata")
+    files = {
+        "users.json": [
+            {"username": "admin", "password": _md5("admin"), "name": "Admin", "role": "ADMIN"},
+            {"username": "bob", "password": _md5("bob"), "name": "Bob", "role": "USER"}
+        ],
+        "parking-lots.json": {"1": {"name": "Lot 1", "location": "X", "capacity": 10, "reserved": 0, "tariff": 2.5, "daytariff": 20}},
+        "payments.json": [],
+        "vehicles.json": {},
+        "reservations.json": {}
+    }
+    for name, data in files.items():
+        with open(tmp_path / "data" / name, "w") as file:
+            json.dump(data, file)
+    with open(tmp_path / "data" / "pdata" / "p1-sessions.json", "w") as file:
+        json.dump({}, file)
+    monkeypatch.chdir(tmp_path)
+    storage_utils._published.clear()
+    storage_utils._pending.clear()
+    yield tmp_path
+    storage_utils._published.clear()
+    storage_utils._pending.clear()
+
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+
+    def request(self, method, path, body=None, token=None, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Length"] = str(len(payload))
+        if token:
+            headers["Authorization"] = token
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read().decode("utf-8")
+        finally:
+            conn.close()
+
+    def login(self, username):
+        status, body = self.request("POST", "/login", {"username": username, "password": username})
+        assert status == 200, body
+        return json.loads(body)["session_token"]
+
+
+@pytest.fixture
+def client(data_dir):
+    import admission
+    import server
+    admission._buckets.clear()
+    httpd = server.ParkingHTTPServer(("127.0.0.1", 0), server.RequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield Client(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
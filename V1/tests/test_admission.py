@@ -0,0 +1,28 @@
+import uuid
+
+import admission
+
+
+def test_made_up_tokens_share_the_address_bucket(client, monkeypatch):
+    monkeypatch.setattr(admission, "_buckets", admission.OrderedDict())
+    statuses = [client.request("GET", "/parking-lots/", token=str(uuid.uuid4()))[0] for _ in range(45)]
+    assert statuses.count(429) > 0
+    assert all(status in (200, 429) for status in statuses)
+
+
+def test_signed_in_users_have_their_own_buckets(client, monkeypatch):
+    token = client.login("bob")
+    monkeypatch.setattr(admission, "_buckets", admission.OrderedDict())
+    for _ in range(40):
+        client.request("GET", "/parking-lots/")
+    assert client.request("GET", "/parking-lots/", token=token)[0] == 200
+
+
+def test_bucket_count_is_capped(monkeypatch):
+    monkeypatch.setattr(admission, "_buckets", admission.OrderedDict())
+    monkeypatch.setattr(admission, "MAX_BUCKETS", 100)
+    for i in range(1000):
+        admission.admit("GET", "/parking-lots/", ("address", f"10.0.{i // 256}.{i % 256}"))
+    assert len(admission._buckets) == 100
+    # the newest clients are the ones kept
+    assert (("address", "10.0.3.231"), "interactive") in admission._buckets
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+import archive_job
+import archive_segments
+import session_index
+import session_store
+import storage_utils
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(data, file)
+
+
+OLD = {"licenseplate": "AB-12-CD", "started": "01-01-2020 10:00:00", "stopped": "01-01-2020 12:00:00", "user": "bob"}
+OPEN = {"licenseplate": "AB-12-CD", "started": "01-03-2025 10:00:00", "stopped": None, "user": "bob"}
+
+
+def test_server_archives_in_process(client, data_dir):
+    write(session_store.hot_file("1"), {"1": OLD})
+    session_index._index.invalidate()
+    assert session_index.history("AB12CD")[0] == 1
+    # a session start not yet written to the hot file by write-behind
+    sessions = session_store.load_sessions("1")
+    sessions["2"] = OPEN
+    storage_utils._pending[session_store.hot_file("1")] = sessions
+
+    admin = client.login("admin")
+    assert client.request("POST", "/admin/archive?keep_days=30", token=client.login("bob"))[0] == 403
+    assert client.request("POST", "/admin/archive?keep_days=-1", token=admin)[0] == 400
+    status, body = client.request("POST", "/admin/archive?keep_days=30", token=admin)
+    assert status == 200
+    assert json.loads(body) == {"lots": {"1": {"archived": 1, "migrated": 0}}, "payments": 0}
+
+    assert not storage_utils.is_pending(session_store.hot_file("1"))
+    with open(session_store.hot_file("1")) as file:
+        assert json.load(file) == {"2": OPEN}
+    assert sorted(sid for sid, _ in session_store.iter_sessions("1")) == ["1", "2"]
+    total, page = session_index.history("AB12CD")
+    assert total == 2 and [session["id"] for session in page] == ["2", "1"]
+
+
+def test_archive_job_refuses_to_run_next_to_a_server(data_dir, monkeypatch):
+    lock = storage_utils.lock_data()
+    assert lock is not None
+    monkeypatch.setattr(sys, "argv", ["archive_job.py"])
+    try:
+        with pytest.raises(SystemExit) as exit:
+            archive_job.main()
+        assert "running server" in str(exit.value)
+    finally:
+        lock.close()
+    archive_job.main()
+
+
+def test_legacy_json_partitions_are_migrated(data_dir):
+    write(f"{session_store.ARCHIVE_DIR}/p1-2020-01.json", {"1": OLD})
+    write(session_store.manifest_file("1"), {"last_sid": 1, "partitions": {"2020-01": {"count": 1, "min_sid": 1, "max_sid": 1}}})
+    assert archive_job.run()["lots"]["1"]["migrated"] == 1
+    assert not os.path.exists(f"{session_store.ARCHIVE_DIR}/p1-2020-01.json")
+    assert session_store.load_manifest("1")["partitions"]["2020-01"]["format"] == "segment"
+    assert session_store.find_session("1", "1") == OLD
+    assert archive_job.run()["lots"]["1"]["migrated"] == 0
+
+
+def test_segments_are_built_without_the_write_lock(data_dir, monkeypatch):
+    write(session_store.hot_file("1"), {"1": OLD})
+    write(data_dir / "data" / "payments.json", [{"transaction": "t1", "amount": 5, "initiator": "bob", "created_at": "01-01-2020 10:00:00", "completed": "01-01-2020 10:01:00", "hash": "h"}])
+    acquired = []
+    write_segment = archive_segments.write_segment
+
+    def write_from_another_thread(*args):
+        # a gate request must be able to take write_lock while a segment is written
+        thread = threading.Thread(target=lambda: acquired.append(storage_utils.write_lock.acquire(timeout=1) and storage_utils.write_lock.release() is None))
+        thread.start()
+        thread.join()
+        return write_segment(*args)
+
+    monkeypatch.setattr(archive_segments, "write_segment", write_from_another_thread)
+    assert archive_job.run() == {"lots": {"1": {"archived": 1, "migrated": 0}}, "payments": 1}
+    assert acquired == [True, True]
+
+
+def test_sessions_changed_while_archiving_stay_live(data_dir, monkeypatch):
+    write(session_store.hot_file("1"), {"1": OLD})
+    write_segment = archive_segments.write_segment
+
+    def change_while_writing(*args):
+        write_segment(*args)
+        storage_utils.save_data(session_store.hot_file("1"), {"1": dict(OLD, stopped="01-01-2020 13:00:00")})
+
+    monkeypatch.setattr(archive_segments, "write_segment", change_while_writing)
+    assert session_store.archive_sessions("1") == 0
+    assert os.listdir(session_store.ARCHIVE_DIR) == []
+    assert session_store.load_sessions("1")["1"]["stopped"] == "01-01-2020 13:00:00"
@@ -0,0 +1,25 @@
+import socket
+
+import metrics
+
+
+def test_unknown_methods_share_one_label(monkeypatch):
+    for name in ("_durations", "_statuses", "_request_bytes", "_response_bytes"):
+        monkeypatch.setattr(metrics, name, {})
+    for method in ("GET", "PROPFIND", "X" * 100, "\x16\x03\x01"):
+        metrics.observe_request(method, "/parking-lots/", 200, 0.01, 0, 10)
+    assert set(metrics._statuses) == {("GET", "/parking-lots/", "200"), ("other", "/parking-lots/", "200")}
+    assert metrics._statuses[("other", "/parking-lots/", "200")] == 3
+
+
+def test_arbitrary_methods_sent_to_the_server(client, monkeypatch):
+    monkeypatch.setattr(metrics, "_statuses", {})
+    for method in (b"BREW", b"FOO"):
+        with socket.create_connection(("127.0.0.1", client.port)) as conn:
+            conn.sendall(method + b" /parking-lots/ HTTP/1.0\r\n\r\n")
+            response = b""
+            # the request is counted after its response, before the connection closes
+            while chunk := conn.recv(1024):
+                response += chunk
+            assert response.startswith(b"HTTP/1.0 501")
+    assert metrics._statuses == {("other", "/parking-lots/", "501"): 2}
@@ -0,0 +1,65 @@
+import json
+
+
+def test_bulk_payments_validate_every_item(client, data_dir):
+    token = client.login("bob")
+    items = [
+        {"transaction": "tx1", "amount": 12.5},
+        {"transaction": "tx2", "amount": "abc"},
+        {"amount": 3}
+    ]
+    status, body = client.request("POST", "/payments/bulk", {"payments": items}, token)
+    assert status == 201
+    result = json.loads(body)
+    assert result["created"] == 1
+    assert result["results"][1] == {"index": 1, "status": "Failed", "code": 400, "error": "Invalid field type, expected number", "field": "amount"}
+    assert result["results"][2]["code"] == 401 and result["results"][2]["field"] == "transaction"
+    with open(data_dir / "data" / "payments.json") as file:
+        assert [p["transaction"] for p in json.load(file)] == ["tx1"]
+
+    status, body = client.request("GET", "/admin/billing/export?format=jsonl", token=client.login("admin"))
+    assert status == 200
+
+
+def test_bulk_completion_validates_every_item(client, data_dir):
+    token = client.login("bob")
+    client.request("POST", "/payments/bulk", {"payments": [{"transaction": "tx1", "amount": 5}]}, token)
+    with open(data_dir / "data" / "payments.json") as file:
+        payment = json.load(file)[0]
+    items = [
+        {"transaction": "tx1", "t_data": "paid", "validation": payment["hash"]},
+        {"transaction": "tx1", "t_data": {"method": "ideal"}, "validation": payment["hash"]}
+    ]
+    status, body = client.request("PUT", "/payments/bulk", {"payments": items}, token)
+    assert status == 200
+    result = json.loads(body)
+    assert result["completed"] == 1
+    assert result["results"][0]["code"] == 400 and result["results"][0]["field"] == "t_data"
+    with open(data_dir / "data" / "payments.json") as file:
+        assert json.load(file)[0]["t_data"] == {"method": "ideal"}
+
+
+def test_payment_listing_includes_archived_payments(client, data_dir):
+    import payment_archive
+    payments = [
+        {"transaction": f"tx{day}", "amount": day, "initiator": "bob", "created_at": f"{day:02d}-01-2025 12:00:00", "completed": day % 2 == 0, "hash": "h"}
+        for day in range(1, 7)
+    ]
+    with open(data_dir / "data" / "payments.json", "w") as file:
+        json.dump(payments, file)
+    token = client.login("bob")
+    # build the index from the live file first, so archiving has to invalidate it
+    assert client.request("GET", "/payments", token=token)[0] == 200
+    assert payment_archive.archive_payments(keep_days=30) == 3
+
+    status, body = client.request("GET", "/payments?offset=1&limit=4", token=token)
+    assert status == 200
+    assert [p["transaction"] for p in json.loads(body)] == ["tx5", "tx4", "tx3", "tx2"]
+    status, body = client.request("GET", "/payments/bob", token=client.login("admin"))
+    assert [p["transaction"] for p in json.loads(body)] == ["tx6", "tx5", "tx4", "tx3", "tx2", "tx1"]
+
+
+def test_completing_an_unknown_payment_is_not_found(client):
+    token = client.login("bob")
+    status, body = client.request("PUT", "/payments/zzz", {"t_data": {}, "validation": "x"}, token)
+    assert status == 404 and body == "Payment not found!"
@@ -0,0 +1,12 @@
+import hashlib
+import json
+
+
+def test_profile_update_only_changes_name_and_password(client, data_dir):
+    token = client.login("bob")
+    status, _ = client.request("PUT", "/profile", {"name": "B", "password": "secret", "role": "ADMIN", "username": "admin"}, token)
+    assert status == 200
+    with open(data_dir / "data" / "users.json") as file:
+        users = {user["username"]: user for user in json.load(file)}
+    assert users["bob"] == {"username": "bob", "password": hashlib.md5(b"secret").hexdigest(), "name": "B", "role": "USER"}
+    assert users["admin"]["role"] == "ADMIN" and users["admin"]["name"] == "Admin"
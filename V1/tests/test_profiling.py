@@ -0,0 +1,29 @@
+import json
+
+import payment_index
+import profiling
+
+
+def profiles(client, token):
+    status, body = client.request("GET", "/admin/profiles", token=token)
+    assert status == 200
+    return json.loads(body)
+
+
+def test_profiling_survives_a_handler_that_raises(client, monkeypatch):
+    token = client.login("admin")
+
+    def broken(*args):
+        raise RuntimeError("injected failure")
+
+    monkeypatch.setattr(payment_index, "for_user", broken)
+    try:
+        client.request("GET", "/payments", token=token, headers={"X-Profile": "1"})
+    except ConnectionError:
+        pass
+    assert not profiling._busy.locked()
+    assert [p["route"] for p in profiles(client, token)] == ["/payments"]
+
+    status, _ = client.request("GET", "/parking-lots/", token=token, headers={"X-Profile": "1"})
+    assert status == 200
+    assert len(profiles(client, token)) == 2
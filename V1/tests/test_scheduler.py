@@ -0,0 +1,24 @@
+import socket
+import time
+
+import scheduler
+import server
+
+
+def test_handlers_time_out_reads():
+    assert server.RequestHandler.timeout == scheduler.HEADER_TIMEOUT
+
+
+def test_stalled_request_does_not_hold_a_worker(client, monkeypatch):
+    monkeypatch.setattr(server.RequestHandler, "timeout", 0.5)
+    stalled = socket.create_connection(("127.0.0.1", client.port))
+    try:
+        # the request line is enough to leave the dispatcher, the headers never follow
+        stalled.sendall(b"POST /login HTTP/1.1\r\n")
+        stalled.settimeout(5)
+        start = time.monotonic()
+        assert stalled.recv(1024) == b""
+        assert time.monotonic() - start < 3
+    finally:
+        stalled.close()
+    client.login("bob")
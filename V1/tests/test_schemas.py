@@ -0,0 +1,25 @@
+import pytest
+
+from schemas import VALIDATORS
+
+
+@pytest.mark.parametrize("schema, body, field", [
+    ("payment", {"transaction": "t1", "amount": None}, "amount"),
+    ("register", {"username": "carol", "password": None}, "password"),
+    ("session", {"licenseplate": None}, "licenseplate"),
+])
+def test_null_required_field_is_missing(schema, body, field):
+    assert VALIDATORS[schema](body) == (401, {"error": "Require field missing", "field": field})
+
+
+def test_null_optional_field_is_accepted():
+    assert VALIDATORS["profile"]({"name": None}) is None
+
+
+def test_null_required_fields_are_refused_by_the_routes(client, data_dir):
+    token = client.login("bob")
+    assert client.request("POST", "/payments", {"transaction": "t1", "amount": None}, token)[0] == 401
+    assert client.request("POST", "/register", {"username": "carol", "password": None})[0] == 401
+    assert client.request("POST", "/parking-lots/1/sessions/start", {"licenseplate": None}, token)[0] == 401
+    with open(data_dir / "data" / "payments.json") as file:
+        assert file.read() == "[]"
@@ -0,0 +1,46 @@
+import json
+import os
+
+import session_index
+import session_store
+import storage_utils
+
+HOT_FILE = session_store.hot_file("1")
+
+
+def write_sessions(sessions):
+    with open(HOT_FILE, "w") as file:
+        json.dump(sessions, file)
+    # make the change visible even on filesystems with coarse mtimes
+    stat = os.stat(HOT_FILE)
+    os.utime(HOT_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def session(plate, started, user="bob"):
+    return {"licenseplate": plate, "started": started, "stopped": None, "user": user}
+
+
+def test_index_is_rebuilt_when_a_hot_file_changes(data_dir):
+    session_index._index.invalidate()
+    assert session_index.history("AB-12-CD") == (0, [])
+    write_sessions({"1": session("AB-12-CD", "01-03-2025 10:00:00")})
+    total, page = session_index.history("ab12cd")
+    assert total == 1 and page[0]["id"] == "1" and page[0]["parkinglot"] == "1"
+
+
+def test_flushing_a_deferred_save_does_not_rebuild(data_dir, monkeypatch):
+    session_index._index.invalidate()
+    session_index.history("")
+    builds = []
+    build = session_index._index._build
+    monkeypatch.setattr(session_index._index, "_build", lambda: builds.append(1) or build())
+    monkeypatch.setattr(storage_utils, "WRITE_BEHIND", True)
+    monkeypatch.setattr(storage_utils, "_start_flusher", lambda: None)
+
+    sessions = {"1": session("AB-12-CD", "01-03-2025 10:00:00")}
+    storage_utils.save_data(HOT_FILE, sessions, defer=True)
+    session_index.record("1", "1", sessions["1"])
+    assert session_index.history("AB12CD")[0] == 1
+    storage_utils.flush()
+    assert session_index.history("AB12CD")[0] == 1
+    assert builds == []
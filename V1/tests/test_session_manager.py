@@ -0,0 +1,34 @@
+import base64
+import json
+
+import pytest
+
+import session_manager
+
+
+@pytest.fixture
+def signed(monkeypatch):
+    monkeypatch.setattr(session_manager, "SECRET", b"test-secret")
+
+
+@pytest.mark.parametrize("token", [
+    "abc.déf",
+    "ééé",
+    "not-a-token",
+    "eyJ4Ijo.broken",
+    base64.urlsafe_b64encode(b"[1, 2]").decode().rstrip("=") + ".sig"
+])
+def test_malformed_tokens_are_rejected(signed, token):
+    assert session_manager.get_session(token) is None
+
+
+def test_signed_token_round_trip(signed, data_dir):
+    token = session_manager.create_token({"username": "bob", "name": "Bob", "role": "USER"})
+    assert session_manager.get_session(token) == {"username": "bob", "name": "Bob", "role": "USER"}
+    session_manager.remove_session(token)
+    assert session_manager.get_session(token) is None
+
+
+def test_non_ascii_token_gets_401(signed, client):
+    status, _ = client.request("GET", "/profile", token="abc.déf")
+    assert status == 401
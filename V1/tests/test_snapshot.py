@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+
+import snapshot
+import storage_utils
+import vehicle_index
+
+
+def add_vehicle(data_dir, plate):
+    path = data_dir / "data" / "vehicles.json"
+    with open(path, "w") as file:
+        json.dump({"bob": {plate: {"licenseplate": plate, "name": "car"}}}, file)
+    # make the change visible even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_snapshot_is_restored_while_the_files_are_unchanged(data_dir):
+    add_vehicle(data_dir, "AB-12-CD")
+    snapshot.warm()
+    snapshot.save()
+    vehicle_index._index.invalidate()
+    vehicle_index._index.state["plates"] = {}
+    assert snapshot.load()
+    assert vehicle_index._index.built
+    assert [owner["username"] for owner in vehicle_index.lookup("AB12CD")] == ["bob"]
+
+
+def test_snapshot_older_than_the_files_falls_back_to_reparsing(data_dir):
+    add_vehicle(data_dir, "AB-12-CD")
+    snapshot.warm()
+    snapshot.save()
+    add_vehicle(data_dir, "XY-99-ZZ")
+    # as in a freshly started server
+    vehicle_index._index.invalidate()
+    storage_utils._published.clear()
+    assert not snapshot.load()
+    snapshot.warm()
+    assert vehicle_index.lookup("AB12CD") == []
+    assert [owner["username"] for owner in vehicle_index.lookup("XY99ZZ")] == ["bob"]
+
+
+def test_snapshot_taken_before_a_flush_is_not_restored(data_dir, monkeypatch):
+    snapshot.warm()
+    monkeypatch.setattr(storage_utils, "flush", lambda: None)
+    storage_utils._pending["data/vehicles.json"] = {"bob": {}}
+    snapshot.save()
+    # the deferred save never reached the file, so the indexes built from it are ahead of it
+    storage_utils._pending.clear()
+    assert not snapshot.load()
+
+
+def test_pickling_does_not_hold_the_write_lock(data_dir, monkeypatch):
+    snapshot.warm()
+    acquired = []
+
+    def from_another_thread(pickler):
+        def pickle(*args):
+            # another request must be able to take write_lock while the snapshot is pickled
+            thread = threading.Thread(target=lambda: acquired.append(storage_utils.write_lock.acquire(timeout=1) and storage_utils.write_lock.release() is None))
+            thread.start()
+            thread.join()
+            return pickler(*args)
+        return pickle
+
+    monkeypatch.setattr(snapshot.pickle, "dump", from_another_thread(snapshot.pickle.dump))
+    monkeypatch.setattr(snapshot.pickle, "dumps", from_another_thread(snapshot.pickle.dumps))
+    snapshot.save()
+    assert acquired and all(acquired)
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from tariffs import compile_tariff
+
+FLAT_LOT = {"tariff": 2.5, "daytariff": 20}
+SCHEDULED_LOT = dict(FLAT_LOT, schedule=[
+    {"days": ["sat", "sun"], "tariff": 1.5},
+    {"days": ["mon", "tue", "wed", "thu", "fri"], "from": "18:00", "to": "07:00", "tariff": 1.0}
+])
+
+
+def price(lot, start, end):
+    return compile_tariff(lot).price(datetime.strptime(start, "%d-%m-%Y %H:%M"), datetime.strptime(end, "%d-%m-%Y %H:%M"))
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    ("03-03-2025 10:00", "03-03-2025 10:02", (0, 1, 0)),
+    ("03-03-2025 10:00", "03-03-2025 13:20", (10.0, 4, 0)),
+    ("03-03-2025 07:00", "03-03-2025 22:59", (20, 16, 0)),
+    ("03-03-2025 20:00", "04-03-2025 06:00", (20, 10, 1)),
+])
+def test_flat_lot_keeps_its_original_pricing(start, end, expected):
+    assert price(FLAT_LOT, start, end) == expected
+
+
+def test_weekday_band_applies_within_a_day():
+    # 17:00-18:00 at the hourly tariff, 18:00-19:00 in the evening band
+    assert price(SCHEDULED_LOT, "03-03-2025 17:00", "03-03-2025 19:00") == (3.5, 2, 0)
+
+
+def test_overnight_stay_is_priced_by_the_evening_band():
+    # monday 20:00 to tuesday 06:00 lies entirely in the 18:00-07:00 band
+    assert price(SCHEDULED_LOT, "03-03-2025 20:00", "04-03-2025 06:00") == (10.0, 10, 2)
+
+
+def test_overnight_stay_leaving_the_band():
+    # 4 hours at 1.0 on monday, 7 at 1.0 and 2 at 2.5 on tuesday
+    assert price(SCHEDULED_LOT, "03-03-2025 20:00", "04-03-2025 09:00") == (16.0, 13, 2)
+
+
+def test_overnight_weekend_stay():
+    assert price(SCHEDULED_LOT, "08-03-2025 20:00", "09-03-2025 06:00") == (15.0, 10, 2)
+
+
+def test_friday_night_into_saturday():
+    # friday's evening band runs until 07:00 on saturday and, listed later, wins over the weekend rate
+    assert price(SCHEDULED_LOT, "07-03-2025 18:00", "08-03-2025 04:00") == (10.0, 10, 2)
+    # from 07:00 saturday the weekend rate applies
+    assert price(SCHEDULED_LOT, "07-03-2025 22:00", "08-03-2025 09:00") == (12.0, 11, 2)
+
+
+def test_day_tariff_caps_every_calendar_day():
+    # monday 10:00-24:00 and tuesday/wednesday are capped at 20, thursday 00:00-09:00 costs 7 + 2 * 2.5
+    assert price(SCHEDULED_LOT, "03-03-2025 10:00", "06-03-2025 09:00") == (72.0, 71, 4)
+
+
+def test_daylight_saving_start_uses_wall_clock_times():
+    # clocks go forward at 02:00 on sunday 30-03-2025; times are naive local times,
+    # so 01:00-04:00 is billed as three weekend hours
+    assert price(SCHEDULED_LOT, "30-03-2025 01:00", "30-03-2025 04:00") == (4.5, 3, 0)
+    # the evening band still starts at 18:00 local time on the following monday
+    assert price(SCHEDULED_LOT, "31-03-2025 17:00", "31-03-2025 19:00") == (3.5, 2, 0)
+
+
+def test_daylight_saving_end_uses_wall_clock_times():
+    # clocks go back at 03:00 on sunday 26-10-2025, a night spanning it is billed by its wall clock length
+    assert price(SCHEDULED_LOT, "25-10-2025 22:00", "26-10-2025 05:00") == (10.5, 7, 2)
+    # and the next monday evening is priced by the band again
+    assert price(SCHEDULED_LOT, "27-10-2025 20:00", "28-10-2025 06:00") == (10.0, 10, 2)
+
+
+def test_invalid_schedule_is_rejected():
+    with pytest.raises(ValueError):
+        compile_tariff(dict(FLAT_LOT, schedule=[{"from": "25:00", "tariff": 1}]))